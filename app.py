@@ -1,7 +1,11 @@
 import asyncio
 import json
+import multiprocessing
+import time
 import typing
-from typing import Any, Dict, List, Optional, Text, Tuple
+from contextlib import aclosing, asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Collection, Dict, List, Optional, Text, Tuple
 
 import aiohttp
 import uvicorn
@@ -17,19 +21,104 @@ from aiogram.types import (
     Update,
 )
 from aiogram.utils.exceptions import TelegramAPIError
+from FlightRadar24.entities.flight import Flight
 from env.settings import (
     APPLICATION_HOST,
     APPLICATION_PORT,
+    APPLICATION_ROLE,
+    APPLICATION_WORKER_TOTAL,
+    APPLICATION_WORKER_URLS,
+    APPLICATION_WORKERS,
+    FLIGHT_CACHE_BACKEND,
+    FLIGHT_CACHE_LIVE_TTL,
+    FLIGHT_CACHE_MAX_BYTES,
+    FLIGHT_CACHE_MAX_ENTRIES,
+    FLIGHT_CACHE_REDIS_URL,
+    FLIGHT_CACHE_SQLITE_PATH,
+    FLIGHT_CACHE_STATIC_TTL,
+    FLIGHT_MAX_RESULTS,
+    FLIGHT_SEARCH_RADIUS,
+    FLIGHT_TILE_MAX_TILES,
+    FLIGHT_TILE_REFRESH_INTERVAL,
+    FLIGHT_TILE_SIZE,
+    FLIGHT_TILE_STALE_IF_ERROR,
+    FLIGHT_TILE_STALE_WHILE_REVALIDATE,
+    FLIGHTRADAR_BASE_URL,
+    FLIGHTRADAR_BREAKER_FAILURES,
+    FLIGHTRADAR_BREAKER_RESET,
+    FLIGHTRADAR_DETAILS_CONCURRENCY,
+    FLIGHTRADAR_DETAILS_TIMEOUT,
+    FLIGHTRADAR_MAX_WORKERS,
+    FLIGHTRADAR_TIMEOUT_MAX,
+    FLIGHTRADAR_TIMEOUT_MIN,
+    INGESTION_BUSY_REPLY_INTERVAL,
+    INGESTION_QUEUE_SIZE,
+    INGESTION_WORKERS,
+    LIVE_MAX_FLIGHTS,
+    LIVE_MAX_SESSIONS,
+    LIVE_MOVEMENT_THRESHOLD,
+    LIVE_REFRESH_INTERVAL,
+    NGROK_API_URL,
+    PAYLOAD_LOG_SAMPLE_RATE,
+    PREWARM_ENABLED,
+    PREWARM_HALF_LIFE,
+    PREWARM_INTERVAL,
+    PREWARM_MAX_TILES,
+    PREWARM_MIN_SCORE,
+    PREWARM_UPSTREAM_BUDGET,
+    REFERENCE_FLUSH_INTERVAL,
+    REFERENCE_INDEX_PATH,
+    RENDER_LOCAL_TIMES,
+    RENDER_STREAMING,
+    RENDER_TIMEZONE,
+    STATE_BACKEND,
+    STATE_MAX_BYTES,
+    STATE_MAX_ENTRIES,
+    STATE_REDIS_URL,
+    STATE_SQLITE_PATH,
+    TELEGRAM_API_SERVER,
     TELEGRAM_BOT_TOKEN,
+    TELEGRAM_BOT_WEBHOOK_DISABLE,
+    TELEGRAM_BOT_WEBHOOK_PATH,
     TELEGRAM_BOT_WEBHOOK_URL,
+    TELEGRAM_CHAT_BURST,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_DISPATCHER_WORKERS,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_MAX_RETRIES,
+    TELEGRAM_POLLING_BATCH_SIZE,
+    TELEGRAM_POLLING_OFFSET_PATH,
+    TELEGRAM_POLLING_TIMEOUT,
+    TELEGRAM_RUN_MODE,
+    TELEGRAM_SETUP_ATTEMPTS,
+    TIMEZONE_IN_MEMORY,
+    UPDATE_DEDUP_TTL,
     logger,
 )
+from env.ngrok_config import async_get_ngrok_public_url
 from fastapi import FastAPI
 from fastapi.requests import Request
-from FlightRadar24.api import FlightRadar24API
-from utils.tools import flight_information_parser, start_background_task
+from fastapi.responses import JSONResponse, PlainTextResponse
+from utils.cache import FlightDetailsCache, MemoryCacheBackend, create_cache_backend
+from utils.dispatcher import TelegramDispatcher, merge_messages
+from utils.flight_radar import AsyncFlightRadar24API
+from utils.geo import bounding_box, nearest
+from utils.ingestion import UpdateQueue
+from utils.live import LiveSession, LiveSessionManager
+from utils.metrics import PayloadLogger, metrics
+from utils.polling import UpdatePoller
+from utils.prewarm import RegionPoller
+from utils.records import FlightRecord
+from utils.reference import get_reference_index
+from utils.render import get_renderer
+from utils.resilience import CircuitOpenError
+from utils.router import UpdateRouter, WorkerUnavailableError
+from utils.tiles import FlightTileIndex
+from utils.timezones import get_timezone_service
+from utils.tools import start_background_task
+
+payload_logger = PayloadLogger(logger, PAYLOAD_LOG_SAMPLE_RATE)
 
-live_locations = {}
 
 class TelegramBot(Bot):
 
@@ -38,9 +127,41 @@ class TelegramBot(Bot):
         return "Telegram"
     
     def __init__(self, 
-                 access_token: Optional[Text]):
+                 access_token: Optional[Text],
+                 api_server: Optional[Text] = None,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE):
         self.access_token = access_token
-        super().__init__(token=access_token, parse_mode="HTML")
+        super().__init__(
+            token=access_token, parse_mode="HTML",
+            server=TelegramAPIServer.from_base(api_server) \
+                if api_server else TELEGRAM_PRODUCTION)
+        self.dispatcher = TelegramDispatcher(
+            global_rate=global_rate,
+            chat_rate=TELEGRAM_CHAT_RATE,
+            chat_burst=TELEGRAM_CHAT_BURST,
+            workers=TELEGRAM_DISPATCHER_WORKERS,
+            max_retries=TELEGRAM_MAX_RETRIES,
+        )
+        self.renderer = get_renderer(RENDER_TIMEZONE or None)
+
+    async def dispatch_message(
+        self, recipient_id: Text, text: Text, **kwargs: Any
+    ) -> Message:
+        """Sends a message through the rate limited dispatcher."""
+        return await self.dispatcher.submit(
+            recipient_id, partial(self.send_message, recipient_id, text, **kwargs))
+
+    async def dispatch_edit(
+        self, recipient_id: Text, message_id: int, text: Text, **kwargs: Any
+    ) -> Any:
+        """Edits a message through the rate limited dispatcher.
+
+        Edits keep live sessions current, so they go before new messages.
+        """
+        return await self.dispatcher.submit(
+            recipient_id,
+            partial(self.edit_message_text, text, recipient_id, message_id, **kwargs),
+            priority=TelegramDispatcher.PRIORITY_EDIT)
 
     async def send_text_message(
         self, recipient_id: Text, text: Text, 
@@ -48,41 +169,240 @@ class TelegramBot(Bot):
     ) -> None:
         """Sends text message."""
         for message_part in text.strip().split("\n\n"):
-            await self.send_message(recipient_id, message_part, 
-                                    reply_markup=reply_markup, parse_mode="HTML")
+            await self.dispatch_message(recipient_id, message_part, 
+                                        reply_markup=reply_markup, parse_mode="HTML")
 
     async def send_airplane_information(
-        self, recipient_id: Text, flights_detail: List[Dict], 
-        message_type: Text, live: bool = False
+        self, recipient_id: Text, flights_detail: List[FlightRecord], 
+        live_session: Optional[LiveSession] = None, compact: bool = False,
+        pending: Collection[Text] = (),
+        sent_messages: Optional[List[Tuple[int, Text]]] = None
     ) -> None:
-        """Sends text message."""
-        for flight_detail in flights_detail:
-            logger.debug(f"Sending flight detail: {flight_detail}")
-            flight_detail_string = flight_information_parser(flight_detail)
-            
-            logger.debug(f"Sending flight detail: {flight_detail_string}")
-            if message_type == 'message':
-                message = await self.send_message(recipient_id, flight_detail_string, 
-                                                  parse_mode="HTML")
-                if live:
-                    live_locations[recipient_id]=message.message_id
-            elif message_type == 'edited_message':
-                message_id = live_locations.get(recipient_id)
-                await self.edit_message_text(flight_detail_string, recipient_id, message_id,
-                                             parse_mode="HTML")
+        """Sends flight information messages.
+
+        Flights whose id is ``pending`` are still waiting for their details
+        and get a summary instead of their card.
+
+        Outside of a live session, the flight cards are merged into as few
+        messages as possible. Given the ``sent_messages`` of a former call
+        for the same flights, as (message id, text) pairs, those messages
+        are edited in place where their text changed, and the extra ones
+        are sent after them and added to the list. Within a live session,
+        each flight has its own message, edited in place only when its text
+        changed. Flights which left the area keep their last message and
+        free their slot.
+        """
+        render_card = self.renderer.render_compact if compact else self.renderer.render
+
+        def render(flight_detail: FlightRecord) -> Text:
+            payload_logger.debug("Sending flight detail: %s", flight_detail)
+            with metrics.span("render"):
+                if flight_detail.get('id') in pending:
+                    return self.renderer.render_summary(flight_detail)
+                return render_card(flight_detail)
+
+        if live_session is None:
+            sent_messages = [] if sent_messages is None else sent_messages
+            flight_detail_strings = [
+                render(flight_detail) for flight_detail in flights_detail]
+            for index, message_text in enumerate(merge_messages(flight_detail_strings)):
+                if index >= len(sent_messages):
+                    message = await self.dispatch_message(recipient_id, message_text, 
+                                                          parse_mode="HTML")
+                    sent_messages.append((message.message_id, message_text))
+                elif sent_messages[index][1] != message_text:
+                    message_id = sent_messages[index][0]
+                    try:
+                        await self.dispatch_edit(recipient_id, message_id,
+                                                 message_text, parse_mode="HTML")
+                        sent_messages[index] = (message_id, message_text)
+                    except TelegramAPIError as e:
+                        logger.warning(f"Failed to edit flight message {message_id}: {e}")
+            return
+
+        flight_ids = {flight_detail.get('id') for flight_detail in flights_detail}
+        for flight_id in list(live_session.messages):
+            if flight_id not in flight_ids:
+                del live_session.messages[flight_id]
 
+        for flight_detail in flights_detail:
+            flight_detail_string = render(flight_detail)
+            flight_id = flight_detail.get('id')
+            sent_message = live_session.messages.get(flight_id)
+            if sent_message is None:
+                if len(live_session.messages) >= live_session.max_flights:
+                    continue
+                message = await self.dispatch_message(recipient_id, flight_detail_string, 
+                                                      parse_mode="HTML")
+                live_session.messages[flight_id] = (
+                    message.message_id, flight_detail_string)
+            elif sent_message[1] != flight_detail_string:
+                try:
+                    await self.dispatch_edit(recipient_id, sent_message[0],
+                                             flight_detail_string, parse_mode="HTML")
+                    live_session.messages[flight_id] = (
+                        sent_message[0], flight_detail_string)
+                except TelegramAPIError as e:
+                    logger.warning(f"Failed to edit flight message {sent_message[0]}: {e}")
+                    live_session.messages.pop(flight_id, None)
+
+
+
+async def get_webhook_url() -> Text:
+    """Returns the webhook url, the ngrok public one when enabled."""
+    if not TELEGRAM_BOT_WEBHOOK_DISABLE:
+        return TELEGRAM_BOT_WEBHOOK_URL
+    public_url = await async_get_ngrok_public_url(NGROK_API_URL)
+    if not public_url:
+        raise RuntimeError("The ngrok tunnel is not up yet.")
+    return public_url.rstrip('/') + TELEGRAM_BOT_WEBHOOK_PATH
+
+
+async def setup_telegram_updates(
+    telegram_channel: TelegramBot, attempts: int = TELEGRAM_SETUP_ATTEMPTS,
+    retry_delay: float = 1.0
+) -> bool:
+    """Sets Telegram webhook, or removes it when the updates are polled.
+
+    Failures, like an ngrok tunnel not up yet, are retried with an
+    exponential backoff. Returns whether it succeeded.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            if TELEGRAM_RUN_MODE == 'polling':
+                # getUpdates is refused while a webhook is set. The pending
+                # updates are kept, polling resumes from its checkpoint.
+                logger.info("Removing Telegram webhook...")
+                await telegram_channel.delete_webhook()
+                logger.info("Telegram webhook removed.")
+                return True
+            webhook_url = await get_webhook_url()
+            logger.info(f"Setting Telegram webhook to {webhook_url}...")
+            await telegram_channel.set_webhook(
+                url=webhook_url, 
+                drop_pending_updates=True, 
+                max_connections=1000)
+            logger.info("Telegram webhook set.")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to set Telegram webhook ({attempt}/{attempts}): {e}")
+            if attempt < attempts:
+                await asyncio.sleep(min(retry_delay * 2 ** (attempt - 1), 30))
+    logger.error("Failed to set Telegram webhook, no update will be received.")
+    return False
+
+
+async def receive_telegram_updates(
+    telegram_channel: TelegramBot, update_poller: UpdatePoller
+) -> None:
+    """Sets up the Telegram updates, then polls them in the polling mode."""
+    if await setup_telegram_updates(telegram_channel) and \
+            TELEGRAM_RUN_MODE == 'polling':
+        await update_poller.run()
+
+
+def create_update_poller(
+    telegram_channel: TelegramBot, handler: typing.Callable
+) -> UpdatePoller:
+    return UpdatePoller(
+        telegram_channel,
+        handler,
+        batch_size=TELEGRAM_POLLING_BATCH_SIZE,
+        timeout=TELEGRAM_POLLING_TIMEOUT,
+        offset_path=TELEGRAM_POLLING_OFFSET_PATH or None,
+    )
 
 
 class PlaneGoesToBot:
 
-    def __init__(self) -> None:
-        self.rest_api_app = FastAPI()
+    def __init__(self, role: Text = 'standalone', global_rate_share: float = 1.0) -> None:
+        """A standalone bot receives its updates itself, a worker gets
+        them from the router, along with its share of the Telegram rate."""
+        self.role = role
+        self.rest_api_app = FastAPI(lifespan=self.lifespan)
+        self.reference_index = get_reference_index(REFERENCE_INDEX_PATH)
+        self.flight_details_cache = FlightDetailsCache(
+            create_cache_backend(
+                FLIGHT_CACHE_BACKEND,
+                max_entries=FLIGHT_CACHE_MAX_ENTRIES,
+                max_bytes=FLIGHT_CACHE_MAX_BYTES,
+                url=FLIGHT_CACHE_REDIS_URL,
+                path=FLIGHT_CACHE_SQLITE_PATH,
+            ),
+            live_ttl=FLIGHT_CACHE_LIVE_TTL,
+            static_ttl=FLIGHT_CACHE_STATIC_TTL,
+            # Other processes sharing the cache have their own reference
+            # index, so they get the full payloads.
+            compact=FLIGHT_CACHE_BACKEND == 'memory',
+        )
+        self.fr_api = AsyncFlightRadar24API(
+            max_workers=FLIGHTRADAR_MAX_WORKERS, cache=self.flight_details_cache,
+            reference=self.reference_index,
+            base_url=FLIGHTRADAR_BASE_URL,
+            timeout_min=FLIGHTRADAR_TIMEOUT_MIN,
+            timeout_max=FLIGHTRADAR_TIMEOUT_MAX,
+            breaker_failures=FLIGHTRADAR_BREAKER_FAILURES,
+            breaker_reset=FLIGHTRADAR_BREAKER_RESET,
+        )
+        self.flight_tiles = FlightTileIndex(
+            self.fr_api,
+            tile_size=FLIGHT_TILE_SIZE,
+            refresh_interval=FLIGHT_TILE_REFRESH_INTERVAL,
+            max_tiles=FLIGHT_TILE_MAX_TILES,
+            stale_while_revalidate=FLIGHT_TILE_STALE_WHILE_REVALIDATE,
+            stale_if_error=FLIGHT_TILE_STALE_IF_ERROR,
+            # Shared by the workers, as the flight details.
+            backend=self.flight_details_cache.backend
+            if FLIGHT_CACHE_BACKEND != 'memory' else None,
+        )
+        self.state_backend = create_cache_backend(
+            STATE_BACKEND,
+            max_entries=STATE_MAX_ENTRIES,
+            max_bytes=STATE_MAX_BYTES,
+            url=STATE_REDIS_URL,
+            path=STATE_SQLITE_PATH,
+        )
+        self.live_sessions = LiveSessionManager(
+            movement_threshold=LIVE_MOVEMENT_THRESHOLD,
+            refresh_interval=LIVE_REFRESH_INTERVAL,
+            max_sessions=LIVE_MAX_SESSIONS,
+            max_flights=LIVE_MAX_FLIGHTS,
+            # The in-memory sessions need no copy in the memory backend.
+            backend=self.state_backend if STATE_BACKEND != 'memory' else None,
+        )
+        self.region_poller = RegionPoller(
+            self.flight_tiles,
+            interval=PREWARM_INTERVAL,
+            max_tiles=PREWARM_MAX_TILES,
+            budget=PREWARM_UPSTREAM_BUDGET,
+            half_life=PREWARM_HALF_LIFE,
+            min_score=PREWARM_MIN_SCORE,
+            details_concurrency=FLIGHTRADAR_DETAILS_CONCURRENCY,
+            details_timeout=FLIGHTRADAR_DETAILS_TIMEOUT,
+        )
+        self.update_queue = UpdateQueue(
+            self.information_retrieval,
+            workers=INGESTION_WORKERS,
+            max_size=INGESTION_QUEUE_SIZE,
+        )
         self.create_rest_api_route()
-        self._set_telegram_webhook()
+        self.telegram_channel = TelegramBot(
+            TELEGRAM_BOT_TOKEN, TELEGRAM_API_SERVER,
+            global_rate=TELEGRAM_GLOBAL_RATE * global_rate_share)
+        self.update_poller = create_update_poller(
+            self.telegram_channel, self.process_update)
         self.background_process = set()
-
-        logger.info("PlaneGoesToBot is ready.")
-        logger.info(f"Telegram webhook url: {TELEGRAM_BOT_WEBHOOK_URL}")
+        # Chat id -> the task completing the cards of its last location.
+        self.card_streams: Dict[Any, asyncio.Task] = {}
+        # Streams run outside the ingestion workers, as many at once.
+        self.card_stream_slots = asyncio.Semaphore(INGESTION_WORKERS)
+        metrics.register_collector(self.collect_metrics)
+
+        logger.info(f"PlaneGoesToBot is ready, as a {self.role}.")
+        if self.role == 'standalone' and TELEGRAM_RUN_MODE == 'polling':
+            logger.info("Telegram updates are polled.")
+        elif self.role == 'standalone':
+            logger.info(f"Telegram webhook url: {TELEGRAM_BOT_WEBHOOK_URL or 'ngrok'}")
 
     def create_rest_api_route(self):
 
@@ -118,6 +438,19 @@ class PlaneGoesToBot:
         async def rest_api_slack_health() -> ResponseMessage:
             return ResponseMessage(True, "Success")
 
+        @self.rest_api_app.get('/planeBot/stats', 
+                               tags=["Health"], responses=default_responses)
+        async def rest_api_stats() -> Dict[Text, Any]:
+            return {"ingestion": self.update_queue.stats(),
+                    "upstream": self.fr_api.stats(),
+                    "flight_cache": self.flight_details_cache.stats()}
+
+        @self.rest_api_app.get('/planeBot/metrics', 
+                               tags=["Health"], response_class=PlainTextResponse)
+        async def rest_api_metrics() -> PlainTextResponse:
+            return PlainTextResponse(
+                metrics.render(), media_type="text/plain; version=0.0.4")
+
         @self.rest_api_app.get('/webhooks/telegram/webhook', 
                                tags=["Webhooks"], responses=default_responses)
         @self.rest_api_app.post('/webhooks/telegram/webhook', 
@@ -128,53 +461,180 @@ class PlaneGoesToBot:
                 return ResponseMessage(False, "No updates received.")
             
             try:
-                updates = await updates.json()
+                with metrics.span("webhook_parse"):
+                    updates = await updates.json()
                 if not updates:
                     return ResponseMessage(False, "No updates received.")
             except Exception as e:
                 logger.error(f"Failed to parse updates: {e}")
                 return ResponseMessage(False, "Failed to parse updates.")
             
-            try:
-                message = updates.get('message', updates.get('edited_message', {}))
-                message_type = 'message' if updates.get('message', None) \
-                    else 'edited_message'
-                logger.debug(f"Received message: {message}")
-                if message.get('location', None) is None:
-                    await self.telegram_channel.send_text_message(
-                        message.get('chat', {}).get('id', None),
-                        "Please share your location to receive flight details."
-                    )
-                    return ResponseMessage(False, "No location found.")
-                
-                start_background_task(
-                    self.background_process,
-                    self.information_retrieval, message, message_type
+            ok, description = await self.process_update(updates)
+            return ResponseMessage(ok, description)
+
+    @asynccontextmanager
+    async def lifespan(self, app: FastAPI) -> AsyncIterator[None]:
+        """Runs the background tasks while the app serves, then closes the
+        upstream session, the reference index and the caches."""
+        start_background_task(
+            self.background_process, self.telegram_channel.dispatcher.run)
+        start_background_task(self.background_process, self.update_queue.run)
+        start_background_task(self.background_process, self.warm_up)
+        start_background_task(
+            self.background_process, self.reference_index.run, REFERENCE_FLUSH_INTERVAL)
+        if PREWARM_ENABLED:
+            start_background_task(self.background_process, self.region_poller.run)
+        if self.role == 'standalone':
+            start_background_task(
+                self.background_process, receive_telegram_updates,
+                self.telegram_channel, self.update_poller)
+        yield
+        for task in [*self.background_process, *self.card_streams.values()]:
+            task.cancel()
+        self.fr_api.close()
+        await self.reference_index.flush()
+        self.reference_index.close()
+        await self.flight_details_cache.backend.close()
+        await self.state_backend.close()
+
+    def collect_metrics(self) -> Dict[Text, float]:
+        """Returns the gauges of the queues, sessions and caches."""
+        ingestion = self.update_queue.stats()
+        gauges = {
+            'ingestion_queue_depth': ingestion['depth'],
+            'ingestion_active': ingestion['active'],
+            'ingestion_wait_p50_seconds': ingestion['wait_p50'],
+            'ingestion_wait_p99_seconds': ingestion['wait_p99'],
+            'telegram_queue_depth': self.telegram_channel.dispatcher.pending,
+            'live_sessions': len(self.live_sessions),
+            'card_streams': len(self.card_streams),
+            'reference_entries': len(self.reference_index),
+        }
+        for method, stats in self.fr_api.stats().items():
+            gauges[f'upstream_{method}_circuit_open'] = int(stats['circuit'] != 'closed')
+            gauges[f'upstream_{method}_timeout_seconds'] = stats['timeout']
+        backend = self.flight_details_cache.backend
+        if isinstance(backend, MemoryCacheBackend):
+            gauges['flight_cache_entries'] = len(backend)
+            gauges['flight_cache_bytes'] = backend.size
+        return gauges
+
+    async def warm_up(self) -> None:
+        """Loads the lazily imported modules in the background, so that
+        neither the startup nor the first lookup waits for them."""
+        def load() -> None:
+            import numpy  # noqa: F401
+            if RENDER_LOCAL_TIMES:
+                get_timezone_service(in_memory=TIMEZONE_IN_MEMORY)
+
+        await asyncio.get_running_loop().run_in_executor(None, load)
+
+    async def process_update(self, update: Dict[Text, Any]) -> Tuple[bool, Text]:
+        """Processes a Telegram update, received by the webhook or polled.
+
+        Returns whether the update was accepted and its description.
+        """
+        try:
+            update_id = update.get('update_id', None)
+            if update_id is not None and not await self.state_backend.add(
+                f"update:{update_id}", 1, UPDATE_DEDUP_TTL
+            ):
+                # Redelivered by Telegram, or by the router to another worker.
+                return True, "Duplicate update."
+
+            message = update.get('message', update.get('edited_message', {}))
+            message_type = 'message' if update.get('message', None) \
+                else 'edited_message'
+            payload_logger.debug("Received message: %s", message)
+            if message.get('location', None) is None:
+                await self.telegram_channel.send_text_message(
+                    message.get('chat', {}).get('id', None),
+                    "Please share your location to receive flight details."
                 )
-                return ResponseMessage(True, "Success")
+                return False, "No location found."
             
-            except Exception as e:
-                logger.exception(f"Failed to process updates: {e}")
-                return ResponseMessage(False, "Failed to process updates.")
+            chat_id = message.get('chat', {}).get('id', None)
+            if not self.update_queue.submit(chat_id, message, message_type):
+                if message_type == 'message' and await self.state_backend.add(
+                    f"busy:{chat_id}", 1, INGESTION_BUSY_REPLY_INTERVAL
+                ):
+                    # Not waited for, so that shedding stays cheap.
+                    start_background_task(
+                        self.background_process, self.send_busy_reply, chat_id)
+                return False, "Busy, try again later."
+            return True, "Success"
+        
+        except Exception as e:
+            logger.exception(f"Failed to process updates: {e}")
+            return False, "Failed to process updates."
+
+    async def send_busy_reply(self, chat_id: Any) -> None:
+        """Tells a chat whose update was shed to try again later."""
+        try:
+            await self.telegram_channel.send_text_message(
+                chat_id, "The bot is busy at the moment. Please try again later.")
+        except Exception as e:
+            logger.debug(f"Failed to send the busy reply to {chat_id}: {e}")
 
     async def information_retrieval(self, message: Dict[Any, Any], message_type: Text):
         user_location = message.get('location')
         if user_location and isinstance(user_location, dict):
             latitude = user_location.get('latitude', None)
             longitude = user_location.get('longitude', None)
-            live = bool(user_location.get('live_period', None))
+            live_period = user_location.get('live_period', None)
 
             if latitude and longitude:
+                chat_id = message.get('chat', {}).get('id', None)
+                live_session = None
+                if live_period:
+                    live_session = await self.live_sessions.load(chat_id)
+                    if message_type == 'message' or live_session is None:
+                        live_session = self.live_sessions.start(
+                            chat_id, latitude, longitude,
+                            expires_at=message.get('date', time.time()) + live_period)
+                    elif not self.live_sessions.move(live_session, latitude, longitude):
+                        logger.debug(f"Live location of {chat_id} barely moved.")
+                        return
+                elif message_type == 'edited_message':
+                    # The live location sharing was stopped.
+                    await self.cancel_card_stream(chat_id)
+                    await self.live_sessions.end(chat_id)
+                    return
+
+                # The cards of the former location are out of date.
+                await self.cancel_card_stream(chat_id)
+                compact = message.get('chat', {}).get('type') in ('group', 'supergroup')
                 try:
-                    if retrieved_information := self.flight_details(
-                        (latitude, longitude)
-                    ):
+                    if message_type == 'message' and RENDER_STREAMING:
+                        # Only the feed is waited for, the cards are
+                        # completed as the details of the flights arrive.
+                        flights, distances, bearings = await self.nearby_flights(
+                            (latitude, longitude))
+                        if flights:
+                            self.start_card_stream(chat_id, partial(
+                                self.stream_airplane_information,
+                                chat_id, flights, distances, bearings, live_session, compact))
+                            return
+                        retrieved_information = []
+                    else:
+                        # Live location refreshes only wait for the feed,
+                        # the details of new flights come with the next ones.
+                        retrieved_information = await self.flight_details(
+                            (latitude, longitude),
+                            wait_for_details=message_type == 'message',
+                        )
+                    if retrieved_information:
                         await self.telegram_channel.send_airplane_information(
-                            message.get('chat', {}).get('id', None),
+                            chat_id,
                             retrieved_information,
-                            message_type,
-                            live
+                            live_session,
+                            compact=compact,
                         )
+                        if live_session is not None:
+                            live_session.refreshed_at = time.time()
+                            await self.live_sessions.save(live_session)
+                    elif message_type == 'edited_message':
+                        return
                     else:
                         await self.telegram_channel.send_text_message(
                             message.get('chat', {}).get('id', None),
@@ -182,6 +642,17 @@ class PlaneGoesToBot:
                                     "Please try again later."
                         )
                     return
+                except CircuitOpenError as e:
+                    # No last known flights either, the live location
+                    # gets them back once FlightRadar24 answers again.
+                    logger.warning(f"No flights to serve: {e}")
+                    if message_type == 'message':
+                        await self.telegram_channel.send_text_message(
+                            chat_id,
+                            "FlightRadar24 is unavailable at the moment. "\
+                                    "Please try again later."
+                        )
+                    return
                 except Exception as e:
                     logger.exception(f"Failed to retrieve information: {e}")
                     await self.telegram_channel.send_text_message(
@@ -198,91 +669,264 @@ class PlaneGoesToBot:
         )
         return
      
-    def run(self) -> None:
+    def run(self, port: int = APPLICATION_PORT) -> None:
         uvicorn.run(
             app=self.rest_api_app,
             host=APPLICATION_HOST,
-            port=APPLICATION_PORT,
+            port=port,
         )
 
-    def _set_telegram_webhook(self) -> None:
-        """Sets Telegram webhook."""
-        logger.info("Setting Telegram webhook...")
-        try:
-            self.telegram_channel = TelegramBot(TELEGRAM_BOT_TOKEN)
-            asyncio.run(self.telegram_channel.set_webhook(
-                url=TELEGRAM_BOT_WEBHOOK_URL, 
-                drop_pending_updates=True, 
-                max_connections=1000))
-            logger.info("Telegram webhook set.")
-        except TelegramAPIError as e:
-            logger.exception("Failed to set Telegram webhook.")
-            raise e
-
-    def flight_details(self, coordinates: Tuple):
-        fr_api = FlightRadar24API()
+    async def nearby_flights(
+        self, coordinates: Tuple
+    ) -> Tuple[List[Flight], List[float], List[float]]:
+        """Returns the nearest flights around the coordinates, from the
+        feed, with their distances and bearings."""
         lat, lon = coordinates
         
-        def get_square(lat, lon, distance):
-            from geopy import Point as GPoint
-            from geopy.distance import geodesic
-            location = GPoint(lat, lon)
-            north = geodesic(kilometers=distance).destination(location, 0)
-            east = geodesic(kilometers=distance).destination(location, 90)
-            south = geodesic(kilometers=distance).destination(location, 180)
-            west = geodesic(kilometers=distance).destination(location, 270)
-            return f"{north.latitude},{south.latitude},{west.longitude},{east.longitude}"
-        
-        logger.info(f"Getting flight details..., from: {get_square(lat, lon, 50)}")
-        flights_detail = fr_api.get_flights(bounds=f"{get_square(lat, lon, 50)}")
-        logger.info(f"Founds {len(flights_detail)} flights.")
-
-        flights_information = []
-        for flight in flights_detail:
-            flight_full_information = fr_api.get_flight_details(flight)
-            flight.set_flight_details(flight_full_information)
-            flights_information.append({
-                'id': flight.id,
-                'number': flight.number,
-                'callsign': flight.callsign,
-
-                'airline_name': flight.airline_name,
-                'airline_code': flight.airline_icao,
-
-                'aircraft_name': flight.aircraft_model,
-                'aircraft_code': flight.aircraft_code,
-                'aircraft_history': [
-                    {
-                        'origin_airport': item.get("airport", {}).get(
-                            "origin", {}).get("name", ""),
-                        'destination_airport': item.get("airport", {}).get(
-                            "destination", {}).get("name", "")
-                    } for item in flight.aircraft_history if item.get("airport", {}) \
-                    and item.get("airport", {}).get("origin", {}) \
-                    and item.get("airport", {}).get("destination", {})
-                ] if flight.aircraft_history else [],
-
-                "origin_airport_country_name": flight.origin_airport_country_name,
-                "origin_airport_country_code": flight.origin_airport_country_code,
-                "origin_airport_name": flight.origin_airport_name,
-                "origin_airport_code": flight.origin_airport_iata,
-
-                "destination_airport_country_name": flight.destination_airport_country_name,
-                "destination_airport_country_code": flight.destination_airport_country_code,
-                "destination_airport_name": flight.destination_airport_name,
-                "destination_airport_code": flight.destination_airport_iata,
-
-                'altitude': flight.altitude,
-                'heading': flight.heading,
-                'speed': flight.ground_speed,
-                'vertical_speed': flight.vertical_speed,
-                'status': "On Ground" if flight.on_ground else "On Air",
-                'status_text': flight.status_text,
-                'status_icon': flight.status_icon,
-
-                'time_details': flight.time_details,
-
-            })
-
+        with metrics.span("bounding_box"):
+            bounds = bounding_box(lat, lon, FLIGHT_SEARCH_RADIUS)
+            self.region_poller.record(bounds)
+        logger.info("Getting flight details..., from: %s", bounds)
+        with metrics.span("area_flights"):
+            flights_detail = await self.flight_tiles.get_flights(bounds)
+
+        # Only the nearest flights inside the search radius are reported.
+        with metrics.span("nearest_flights"):
+            indices, distances, bearings = nearest(
+                lat, lon,
+                [flight.latitude for flight in flights_detail],
+                [flight.longitude for flight in flights_detail],
+                radius_km=FLIGHT_SEARCH_RADIUS,
+                limit=FLIGHT_MAX_RESULTS,
+            )
+            flights_detail = [flights_detail[index] for index in indices]
+        logger.info("Founds %d flights. Upstream tile fetches: %d",
+                    len(flights_detail), self.flight_tiles.upstream_calls)
+        return flights_detail, distances, bearings
+
+    def flight_records(self, flights_detail: List[Flight], distances: List[float],
+                       bearings: List[float]) -> List[FlightRecord]:
+        flights_information = [
+            FlightRecord.from_flight(flight, distance, bearing)
+            for flight, distance, bearing in zip(flights_detail, distances, bearings)
+        ]
+
+        if RENDER_LOCAL_TIMES:
+            self.set_airport_timezones(flights_information)
         return flights_information
 
+    async def flight_details(self, coordinates: Tuple,
+                             wait_for_details: bool = True) -> List[FlightRecord]:
+        flights_detail, distances, bearings = await self.nearby_flights(coordinates)
+
+        enriched = await self.fr_api.set_flights_details(
+            flights_detail,
+            concurrency=FLIGHTRADAR_DETAILS_CONCURRENCY,
+            timeout=FLIGHTRADAR_DETAILS_TIMEOUT,
+            wait=wait_for_details,
+        )
+        logger.info("Got details of %d/%d flights.", enriched, len(flights_detail))
+        return self.flight_records(flights_detail, distances, bearings)
+
+    async def stream_airplane_information(
+        self, chat_id: Any, flights_detail: List[Flight], distances: List[float],
+        bearings: List[float], live_session: Optional[LiveSession], compact: bool
+    ) -> None:
+        """Sends the cards of the flights, completing them as their details
+        arrive.
+
+        The flights with cached details get their card at once, the others
+        a summary from the feed. Each batch of arriving details edits the
+        cards in place, and once the lookups are over the flights still
+        without details get their card with the feed data only.
+        """
+        pending = {flight.id for flight in flights_detail}
+        sent_messages: List[Tuple[int, Text]] = []
+
+        async def send() -> None:
+            await self.telegram_channel.send_airplane_information(
+                chat_id,
+                self.flight_records(flights_detail, distances, bearings),
+                live_session,
+                compact=compact,
+                pending=pending,
+                sent_messages=sent_messages,
+            )
+            if live_session is not None:
+                live_session.refreshed_at = time.time()
+                await self.live_sessions.save(live_session)
+
+        try:
+            # Closed on cancellation, which drops the lookups not started.
+            async with aclosing(self.fr_api.stream_flights_details(
+                flights_detail,
+                concurrency=FLIGHTRADAR_DETAILS_CONCURRENCY,
+                timeout=FLIGHTRADAR_DETAILS_TIMEOUT,
+            )) as stream:
+                async for enriched in stream:
+                    pending.difference_update(flight.id for flight in enriched)
+                    await send()
+            if pending:
+                logger.info("Got details of %d/%d flights.",
+                            len(flights_detail) - len(pending), len(flights_detail))
+                pending.clear()
+                await send()
+        except Exception as e:
+            logger.exception(f"Failed to stream flight information: {e}")
+            if not sent_messages and (live_session is None or not live_session.messages):
+                await self.telegram_channel.send_text_message(
+                    chat_id,
+                    "Failed to retrieve information. "\
+                            "Please try again later."
+                )
+
+    def start_card_stream(self, chat_id: Any,
+                          stream: typing.Callable[[], typing.Awaitable]) -> None:
+        """Runs the card stream of a chat in the background, once one of
+        the ``INGESTION_WORKERS`` stream slots is free."""
+        async def run() -> None:
+            async with self.card_stream_slots:
+                await stream()
+
+        task = asyncio.ensure_future(run())
+        self.card_streams[chat_id] = task
+
+        def done(task: asyncio.Task) -> None:
+            if self.card_streams.get(chat_id) is task:
+                del self.card_streams[chat_id]
+
+        task.add_done_callback(done)
+
+    async def cancel_card_stream(self, chat_id: Any) -> None:
+        """Cancels the card stream of a chat, if any, for a newer location."""
+        task = self.card_streams.pop(chat_id, None)
+        if task is None or task.done():
+            return
+        task.cancel()
+        # Waited for, so that it leaves the live session alone from now on.
+        await asyncio.wait({task})
+        metrics.increment("card_streams_cancelled")
+
+    def set_airport_timezones(self, flights_information: List[FlightRecord]) -> None:
+        """Adds the timezones of the flights airports.
+
+        They come from the reference index, or are looked up in one batch
+        from the airports coordinates when it lacks them.
+        """
+        points, targets = [], []
+        for flight_information in flights_information:
+            for airport in ('origin_airport', 'destination_airport'):
+                entry = self.reference_index.airport(
+                    getattr(flight_information, f'{airport}_code'))
+                if entry is None:
+                    continue
+                if entry.timezone:
+                    setattr(flight_information, f'{airport}_timezone', entry.timezone)
+                elif entry.latitude is not None and entry.longitude is not None:
+                    points.append((entry.latitude, entry.longitude))
+                    targets.append((flight_information, f'{airport}_timezone'))
+        if not points:
+            return
+
+        timezones = get_timezone_service(
+            in_memory=TIMEZONE_IN_MEMORY).timezones_at(points)
+        for (flight_information, key), timezone in zip(targets, timezones):
+            setattr(flight_information, key, timezone)
+
+
+
+def run_worker(port: int, workers: int) -> None:
+    """Runs a bot worker process of the router."""
+    PlaneGoesToBot(role='worker', global_rate_share=1 / workers).run(port=port)
+
+
+class PlaneGoesToRouter:
+    """Receives the Telegram updates and routes them to the bot workers.
+
+    ``workers`` bot processes are started on the ports following
+    ``APPLICATION_PORT``, and ``worker_urls`` adds bots running on other
+    hosts. The updates of a chat always go to the same worker.
+    """
+
+    def __init__(self, workers: int = APPLICATION_WORKERS,
+                 worker_urls: Optional[List[Text]] = None) -> None:
+        self.workers = workers if workers > 1 else 0
+        self.worker_ports = [APPLICATION_PORT + 1 + index for index in range(self.workers)]
+        self.update_router = UpdateRouter(
+            [f"http://127.0.0.1:{port}" for port in self.worker_ports] + \
+                list(worker_urls or []))
+        self.rest_api_app = FastAPI(lifespan=self.lifespan)
+        self.telegram_channel = TelegramBot(TELEGRAM_BOT_TOKEN, TELEGRAM_API_SERVER)
+        self.update_poller = create_update_poller(
+            self.telegram_channel, self.update_router.forward)
+        self.background_process = set()
+        self.worker_processes: List[multiprocessing.Process] = []
+        self.create_rest_api_route()
+
+    def create_rest_api_route(self):
+
+        @self.rest_api_app.get('/planeBot/health', tags=["Health"])
+        async def rest_api_router_health() -> Dict[Text, Any]:
+            return {
+                "ok": True,
+                "workers": self.update_router.worker_urls,
+                "alive": [process.is_alive() for process in self.worker_processes],
+            }
+
+        @self.rest_api_app.post('/webhooks/telegram/webhook', tags=["Webhooks"])
+        async def rest_api_router_webhook(updates: Request) -> Dict[Text, Any]:
+            try:
+                update = await updates.json()
+            except Exception as e:
+                logger.error(f"Failed to parse updates: {e}")
+                return {"ok": False, "description": "Failed to parse updates."}
+            try:
+                ok, description = await self.update_router.forward(update)
+            except WorkerUnavailableError as e:
+                # Telegram delivers the update again later.
+                return JSONResponse({"ok": False, "description": str(e)}, status_code=503)
+            return {"ok": ok, "description": description}
+
+    @asynccontextmanager
+    async def lifespan(self, app: FastAPI) -> AsyncIterator[None]:
+        """Receives the updates while the app serves."""
+        start_background_task(
+            self.background_process, receive_telegram_updates,
+            self.telegram_channel, self.update_poller)
+        yield
+        for task in self.background_process:
+            task.cancel()
+        await self.update_router.close()
+
+    def start_workers(self) -> None:
+        context = multiprocessing.get_context('spawn')
+        for port in self.worker_ports:
+            process = context.Process(
+                target=run_worker, args=(port, len(self.update_router.worker_urls)),
+                name=f"plane_goes_to_bot:{port}", daemon=True)
+            process.start()
+            self.worker_processes.append(process)
+        logger.info(f"Routing updates to {self.update_router.worker_urls}.")
+
+    def run(self) -> None:
+        self.start_workers()
+        try:
+            uvicorn.run(
+                app=self.rest_api_app,
+                host=APPLICATION_HOST,
+                port=APPLICATION_PORT,
+            )
+        finally:
+            for process in self.worker_processes:
+                process.terminate()
+
+
+def create_application() -> typing.Union[PlaneGoesToBot, PlaneGoesToRouter]:
+    """Creates the bot of the role set in the settings."""
+    if APPLICATION_ROLE == 'router':
+        return PlaneGoesToRouter(APPLICATION_WORKERS, APPLICATION_WORKER_URLS)
+    if APPLICATION_ROLE == 'worker':
+        # A remote worker, sharing the Telegram rate with the other ones.
+        return PlaneGoesToBot(role=APPLICATION_ROLE,
+                              global_rate_share=1 / max(1, APPLICATION_WORKER_TOTAL))
+    return PlaneGoesToBot(role=APPLICATION_ROLE)
@@ -0,0 +1,190 @@
+"""Local stand-in of the FlightRadar24 endpoints the bot uses.
+
+Serves the flight feed (``/zones/fcgi/feed.js``) and the flight details
+(``/clickhandler/``) with a configurable latency. The feed holds
+``--density`` flights per square degree, flying on from stable starting
+points, unless a recorded feed is replayed with ``--feed-file``. The details replay the
+flight of ``assets/plane_info.json``, or a recorded payload given with
+``--details-file``. ``/stats`` returns the request counts.
+
+Point the bot at it with ``FLIGHTRADAR_BASE_URL=http://127.0.0.1:<port>``.
+
+Usage: python3 benchmarks/fake_flightradar.py [--port 8301] [--latency 0.1]
+"""
+import argparse
+import ast
+import asyncio
+import copy
+import json
+import math
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Text
+
+from aiohttp import web
+
+ROOT_DIR = Path(__file__).parent.parent
+
+
+def load_recorded_details(path: Text = os.path.join(ROOT_DIR, 'assets', 'plane_info.json')
+                          ) -> Dict[Text, Any]:
+    """Returns the details payload of the recorded flight."""
+    with open(path) as f:
+        # The asset is a Python literal dump of a FlightRadar24 Flight.
+        flight = ast.literal_eval(f.read())
+
+    def airport(prefix: Text) -> Dict[Text, Any]:
+        return {
+            "name": flight[f"{prefix}_name"],
+            "code": {"iata": flight[f"{prefix}_iata"], "icao": flight[f"{prefix}_icao"]},
+            "position": {
+                "latitude": flight[f"{prefix}_latitude"],
+                "longitude": flight[f"{prefix}_longitude"],
+                "altitude": flight[f"{prefix}_altitude"],
+                "country": {
+                    "name": flight[f"{prefix}_country_name"],
+                    "code": flight[f"{prefix}_country_code"],
+                },
+            },
+            "timezone": {
+                "name": flight[f"{prefix}_timezone_name"],
+                "offset": flight[f"{prefix}_timezone_offset"],
+            },
+            "info": {"terminal": flight[f"{prefix}_terminal"]},
+            "visible": True,
+        }
+
+    return {
+        "identification": {"id": flight["id"], "number": {"default": flight["number"]},
+                           "callsign": flight["callsign"]},
+        "aircraft": {"model": {"code": flight["aircraft_code"],
+                               "text": flight["aircraft_model"]}, "images": {}},
+        "airline": {"name": flight["airline_name"], "short": flight["airline_short_name"],
+                    "code": {"icao": flight["airline_icao"]}},
+        "owner": None,
+        "airport": {"origin": airport("origin_airport"),
+                    "destination": airport("destination_airport"), "real": None},
+        "flightHistory": {"aircraft": flight["aircraft_history"]},
+        "status": {"icon": flight["status_icon"], "text": flight["status_text"]},
+        "time": flight["time_details"],
+        "trail": flight["trail"],
+    }
+
+
+class FakeFlightRadar:
+    """Feed and details endpoints with a latency and request counters."""
+
+    def __init__(self, latency: float = 0.1, density: float = 2.0,
+                 details: Optional[Dict[Text, Any]] = None,
+                 feed: Optional[Dict[Text, Any]] = None, seed: int = 0) -> None:
+        self.latency = latency
+        self.density = density
+        self.details = details or load_recorded_details()
+        self.feed = feed
+        self.seed = seed
+        self.started = time.time()
+        self.counts = {"feed": 0, "details": 0}
+
+    async def _wait(self) -> None:
+        if self.latency:
+            # Jittered, like a remote service.
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+
+    def cell_flights(self, row: int, column: int) -> Dict[Text, List[Any]]:
+        """Returns the feed rows of the flights starting in a one degree cell.
+
+        The flights are the same between calls, and fly on with time.
+        """
+        rng = random.Random(hash((self.seed, row, column)))
+        # The codes of the recorded details, which every flight replays.
+        airports = self.details.get("airport") or {}
+        origin, destination = (
+            ((airports.get(airport) or {}).get("code") or {}).get("iata") or ""
+            for airport in ("origin", "destination"))
+        aircraft = ((self.details.get("aircraft") or {}).get("model") or {}).get("code") or ""
+        airline = ((self.details.get("airline") or {}).get("code") or {}).get("icao") or ""
+        count = int(self.density) + (rng.random() < self.density % 1)
+        hours = (time.time() - self.started) / 3600
+        flights = {}
+        for index in range(count):
+            heading = rng.randrange(360)
+            ground_speed = rng.randrange(120, 520)
+            vertical_speed = rng.randrange(-2000, 2000, 64)
+            # Knots to degrees of latitude per hour, roughly.
+            distance = ground_speed * hours / 60
+            latitude = row + rng.random() + distance * math.cos(math.radians(heading))
+            longitude = column + rng.random() + distance * math.sin(math.radians(heading))
+            altitude = min(max(rng.randrange(0, 40000, 25) + vertical_speed * hours * 60,
+                               0), 45000)
+            flight_id = f"{(row + 90) * 1000 + column + 180:06d}{index:02d}"
+            flights[flight_id] = [
+                f"{rng.getrandbits(24):06X}", latitude, longitude,
+                heading, int(altitude), ground_speed,
+                "", "F-FAKE", aircraft, f"EP-{index:03d}", int(time.time()),
+                origin, destination, f"EP{rng.randrange(1000):03d}", 0,
+                vertical_speed, f"{airline}{rng.randrange(1000):03d}", 0, airline,
+            ]
+        return flights
+
+    async def handle_feed(self, request: web.Request) -> web.Response:
+        self.counts["feed"] += 1
+        await self._wait()
+        north, south, west, east = map(float, request.query["bounds"].split(","))
+        response: Dict[Text, Any] = {"full_count": 0, "version": 4}
+        if self.feed is not None:
+            rows = {key: value for key, value in self.feed.items() if key[0].isdigit()}
+        else:
+            rows = {}
+            for row in range(math.floor(south), math.floor(min(north, 89.999)) + 1):
+                for column in range(math.floor(west), math.floor(min(east, 179.999)) + 1):
+                    rows.update(self.cell_flights(row, column))
+        for flight_id, row in rows.items():
+            if south <= row[1] <= north and west <= row[2] <= east:
+                response[flight_id] = row
+        response["full_count"] = len(response) - 2
+        return web.json_response(response)
+
+    async def handle_details(self, request: web.Request) -> web.Response:
+        self.counts["details"] += 1
+        await self._wait()
+        details = copy.deepcopy(self.details)
+        details["identification"]["id"] = request.query.get("flight")
+        return web.json_response(details)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.counts)
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/zones/fcgi/feed.js', self.handle_feed)
+        app.router.add_get('/clickhandler/', self.handle_details)
+        app.router.add_get('/stats', self.handle_stats)
+        return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8301)
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help="mean seconds per request")
+    parser.add_argument('--density', type=float, default=2.0,
+                        help="flights per square degree")
+    parser.add_argument('--feed-file', help="recorded feed.js payload to replay")
+    parser.add_argument('--details-file', help="recorded details payload to replay")
+    args = parser.parse_args()
+
+    feed = details = None
+    if args.feed_file:
+        with open(args.feed_file) as f:
+            feed = json.load(f)
+    if args.details_file:
+        with open(args.details_file) as f:
+            details = json.load(f)
+    fake = FakeFlightRadar(args.latency, args.density, details=details, feed=feed)
+    web.run_app(fake.application(), host='127.0.0.1', port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Local stand-in of the Telegram Bot API, with its rate limits.
+
+Answers the methods the bot calls, at ``/bot<token>/<method>``. Messages
+over ``--global-rate`` per second, or over ``--chat-rate`` per second and
+chat after a burst of ``--chat-burst``, are refused with a 429 and a
+``retry_after``, as Telegram does. ``/stats`` returns the call counts.
+``getUpdates`` serves the updates queued with ``queue_update`` and, as
+Telegram's long polling, waits up to its ``timeout`` for one.
+
+Point the bot at it with ``TELEGRAM_API_SERVER=http://127.0.0.1:<port>``.
+
+Usage: python3 benchmarks/fake_telegram.py [--port 8302] [--global-rate 30]
+"""
+import argparse
+import asyncio
+import math
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Text
+
+from aiohttp import web
+
+MESSAGE_METHODS = ('sendMessage', 'editMessageText')
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second, after a burst of ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Takes a token, or returns the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class FakeTelegram:
+    """Bot API methods with rate limits and call counters.
+
+    ``on_message`` is called with the chat id and the method of every
+    accepted message, to time the answers of the bot.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 on_message: Optional[Callable[[int, Text], None]] = None) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.on_message = on_message
+        self.counts: Counter = Counter()
+        self.message_id = 0
+        self.updates: List[Dict[Text, Any]] = []
+        self._new_updates = asyncio.Event()
+
+    def queue_update(self, update: Dict[Text, Any]) -> None:
+        """Queues an update for ``getUpdates``."""
+        self.updates.append(update)
+        self._new_updates.set()
+
+    async def get_updates(self, offset: int, limit: int, timeout: float) -> List[Dict[Text, Any]]:
+        """Returns the updates from ``offset`` on, waiting up to ``timeout``
+        seconds for one when there are none."""
+        # The updates before the offset are confirmed, and forgotten.
+        self.updates = [update for update in self.updates if update['update_id'] >= offset]
+        if not self.updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+    @staticmethod
+    def result(result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def retry_after(seconds: float) -> web.Response:
+        retry_after = max(1, math.ceil(seconds))
+        return web.json_response({
+            "ok": False, "error_code": 429,
+            "description": f"Too Many Requests: retry after {retry_after}",
+            "parameters": {"retry_after": retry_after},
+        }, status=429)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        if request.content_type == 'application/json':
+            data = await request.json()
+        else:
+            data = dict(await request.post())
+        self.counts[method] += 1
+
+        if method == 'getMe':
+            return self.result({"id": 1, "is_bot": True, "first_name": "Plane Goes To",
+                                "username": "plane_goes_to_bot"})
+        if method == 'getUpdates':
+            return self.result(await self.get_updates(
+                int(data.get('offset') or 0), int(data.get('limit') or 100),
+                float(data.get('timeout') or 0)))
+        if method not in MESSAGE_METHODS:
+            return self.result(True)
+
+        chat_id = int(data['chat_id'])
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        wait = bucket.take()
+        if not wait and (wait := self.global_bucket.take()):
+            # Refused, so the chat did not spend its message.
+            bucket.tokens += 1
+        if wait:
+            self.counts['retry_after'] += 1
+            return self.retry_after(wait)
+
+        if self.on_message is not None:
+            self.on_message(chat_id, method)
+        if method == 'sendMessage':
+            self.message_id += 1
+            message_id = self.message_id
+        else:
+            message_id = int(data['message_id'])
+        return self.result({"message_id": message_id, "date": int(time.time()),
+                            "chat": {"id": chat_id, "type": "private"},
+                            "text": data.get('text', "")})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.counts))
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        app.router.add_get('/stats', self.handle_stats)
+        return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8302)
+    parser.add_argument('--global-rate', type=float, default=30,
+                        help="messages per second of the bot")
+    parser.add_argument('--chat-rate', type=float, default=1,
+                        help="messages per second and chat")
+    parser.add_argument('--chat-burst', type=float, default=3,
+                        help="messages a chat can get at once")
+    args = parser.parse_args()
+
+    fake = FakeTelegram(args.global_rate, args.chat_rate, args.chat_burst)
+    web.run_app(fake.application(), host='127.0.0.1', port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""Load test of the bot against local FlightRadar24 and Telegram stand-ins.
+
+Starts ``fake_flightradar`` and ``fake_telegram``, runs the bot
+(``main.py``) against them, and posts synthetic location updates to its
+webhook at ``--rate`` per second. With ``--run-mode polling``, the
+updates are queued in the stand-in Telegram instead, and the bot pulls
+them with ``getUpdates``. A ``--live-share`` of the chats share
+a live location, whose later updates are edits moving the location. The
+answer latency of an update is the time from its post to the next
+message the stand-in Telegram gets for its chat. An update followed by
+another one of its chat before any message is counted as superseded, and
+a live edit with no change to the cards gets no message at all.
+
+Reports the throughput, the p50/p99 webhook and answer latencies, and
+the upstream calls the bot made. Runs offline, with no token needed.
+
+Usage: python3 benchmarks/load_test.py [--updates 500] [--rate 50] [--chats 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Text
+
+import aiohttp
+from aiohttp import web
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fake_flightradar import FakeFlightRadar  # noqa: E402
+from fake_telegram import FakeTelegram  # noqa: E402
+
+WEBHOOK_PATH = '/webhooks/telegram/webhook'
+
+# Settings the bot requires, only used when missing from the environment.
+BOT_ENV_DEFAULTS = {
+    'NETWORK_NAME': 'load_test',
+    'APPLICATION_HOST_NAME': 'localhost',
+    'NGROK_AUTHTOKEN': '-', 'NGROK_HOST_NAME': 'localhost', 'NGROK_PORT': '4040',
+    'NGROK_REGION': 'us', 'NGROK_VERSION': '3',
+    'TELEGRAM_BOT_TOKEN': '123456:' + 'A' * 35,
+    'TELEGRAM_BOT_USERNAME': 'plane_goes_to_bot',
+    'LOG_LEVEL': 'WARNING',
+    'REFERENCE_INDEX_PATH': os.path.join(tempfile.gettempdir(), 'load_test_reference.idx'),
+}
+
+
+def percentile(values: List[float], value: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(value * len(values)))]
+
+
+class LoadGenerator:
+    """Posts synthetic updates and times the answers of the bot.
+
+    Given the stand-in ``telegram``, the updates are queued there for the
+    bot to poll rather than posted to its webhook.
+    """
+
+    def __init__(self, bot_url: Text, chats: int, live_share: float,
+                 latitude: float, longitude: float, spread: float, seed: int = 0,
+                 telegram: Optional[FakeTelegram] = None) -> None:
+        self.webhook_url = bot_url.rstrip('/') + WEBHOOK_PATH
+        self.telegram = telegram
+        self.rng = random.Random(seed)
+        self.chats = [{
+            'id': 100000 + index,
+            'live': self.rng.random() < live_share,
+            'location': [latitude + self.rng.uniform(-spread, spread),
+                         longitude + self.rng.uniform(-spread, spread)],
+            'message_id': None,
+        } for index in range(chats)]
+        self.update_id = 0
+        self.pending: Dict[int, float] = {}
+        self.webhook_latencies: List[float] = []
+        self.answer_latencies: List[float] = []
+        self.failed = 0
+        self.superseded = 0
+        self.last_answer = 0.0
+
+    def on_message(self, chat_id: int, method: Text) -> None:
+        now = time.perf_counter()
+        started = self.pending.pop(chat_id, None)
+        if started is not None:
+            self.answer_latencies.append(now - started)
+            self.last_answer = now
+
+    def next_update(self, chat: Dict[Text, Any]) -> Dict[Text, Any]:
+        """Returns a new location of the chat, an edit if it is live and started."""
+        self.update_id += 1
+        message: Dict[Text, Any] = {
+            'date': int(time.time()),
+            'chat': {'id': chat['id'], 'type': 'private'},
+            'from': {'id': chat['id'], 'is_bot': False, 'first_name': 'Load'},
+        }
+        if chat['live'] and chat['message_id'] is not None:
+            # About 1 km, over the movement threshold of the live sessions.
+            chat['location'][0] += self.rng.choice((-0.01, 0.01))
+            message['message_id'] = chat['message_id']
+            message['edit_date'] = int(time.time())
+            kind = 'edited_message'
+        else:
+            message['message_id'] = chat['message_id'] = self.update_id
+            kind = 'message'
+        latitude, longitude = chat['location']
+        message['location'] = {'latitude': latitude, 'longitude': longitude}
+        if chat['live']:
+            message['location']['live_period'] = 3600
+        return {'update_id': self.update_id, kind: message}
+
+    async def post(self, session: aiohttp.ClientSession, update: Dict[Text, Any],
+                   chat_id: int) -> None:
+        started = time.perf_counter()
+        if chat_id in self.pending:
+            self.superseded += 1
+        self.pending[chat_id] = started
+        try:
+            async with session.post(self.webhook_url, json=update) as response:
+                answer = await response.json()
+            if not answer.get('ok'):
+                self.failed += 1
+        except Exception:
+            self.failed += 1
+        self.webhook_latencies.append(time.perf_counter() - started)
+
+    def queue(self, update: Dict[Text, Any], chat_id: int) -> None:
+        if chat_id in self.pending:
+            self.superseded += 1
+        self.pending[chat_id] = time.perf_counter()
+        self.telegram.queue_update(update)
+
+    async def run(self, updates: int, rate: float, drain: float) -> float:
+        """Posts the updates, waits for their answers and returns the duration."""
+        started = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            posts = []
+            for index in range(updates):
+                delay = started + index / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                chat = self.rng.choice(self.chats)
+                if self.telegram is not None:
+                    self.queue(self.next_update(chat), chat['id'])
+                    continue
+                posts.append(asyncio.create_task(
+                    self.post(session, self.next_update(chat), chat['id'])))
+            await asyncio.gather(*posts)
+
+        deadline = time.perf_counter() + drain
+        while self.pending and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+        return (self.last_answer or time.perf_counter()) - started
+
+
+async def serve(application: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(application, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def wait_for_bot(bot_url: Text, process: Optional[subprocess.Popen],
+                       timeout: float = 60) -> None:
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"The bot exited with code {process.returncode}.")
+            try:
+                async with session.get(bot_url.rstrip('/') + '/planeBot/health') as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"The bot did not start at {bot_url}.")
+
+
+def start_bot(args: argparse.Namespace) -> subprocess.Popen:
+    bot_env = {**BOT_ENV_DEFAULTS, **os.environ}
+    bot_env.update(
+        APPLICATION_PORT=str(args.bot_port),
+        TELEGRAM_RUN_MODE=args.run_mode,
+        TELEGRAM_POLLING_OFFSET_PATH='',
+        TELEGRAM_BOT_WEBHOOK_DISABLE='0',
+        TELEGRAM_BOT_WEBHOOK_URL=f'http://127.0.0.1:{args.bot_port}',
+        TELEGRAM_API_SERVER=f'http://127.0.0.1:{args.telegram_port}',
+        FLIGHTRADAR_BASE_URL=f'http://127.0.0.1:{args.flightradar_port}',
+    )
+    # Drops the access log, the warnings and errors go to stderr.
+    return subprocess.Popen([sys.executable, 'main.py'], cwd=ROOT_DIR, env=bot_env,
+                            stdout=subprocess.DEVNULL)
+
+
+async def load_test(args: argparse.Namespace) -> None:
+    bot_url = args.bot_url or f'http://127.0.0.1:{args.bot_port}'
+    telegram = FakeTelegram(args.global_rate, args.chat_rate, args.chat_burst)
+    generator = LoadGenerator(bot_url, args.chats, args.live_share,
+                              args.latitude, args.longitude, args.spread,
+                              telegram=telegram if args.run_mode == 'polling' else None)
+    telegram.on_message = generator.on_message
+    flightradar = FakeFlightRadar(args.latency, args.density)
+    runners = [await serve(flightradar.application(), args.flightradar_port),
+               await serve(telegram.application(), args.telegram_port)]
+    process = None if args.bot_url else start_bot(args)
+    try:
+        await wait_for_bot(bot_url, process)
+        duration = await generator.run(args.updates, args.rate, args.drain)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        for runner in runners:
+            await runner.cleanup()
+
+    answered = len(generator.answer_latencies)
+    unanswered = len(generator.pending)
+    milliseconds = [latency * 1000 for latency in generator.answer_latencies]
+    webhook = [latency * 1000 for latency in generator.webhook_latencies]
+    print(f"{'updates':<20}{args.updates} posted at {args.rate:g}/s to {args.chats} chats, "
+          f"{generator.failed} refused")
+    print(f"{'throughput':<20}{answered / duration if duration > 0 else 0:.1f} answered/s, "
+          f"{generator.superseded} superseded, {unanswered} unanswered")
+    if webhook:
+        print(f"{'webhook latency':<20}p50 {percentile(webhook, 0.5):.1f} ms, "
+              f"p99 {percentile(webhook, 0.99):.1f} ms")
+    print(f"{'answer latency':<20}p50 {percentile(milliseconds, 0.5):.1f} ms, "
+          f"p99 {percentile(milliseconds, 0.99):.1f} ms")
+    print(f"{'flightradar calls':<20}" + ", ".join(
+        f"{name} {count}" for name, count in flightradar.counts.items()))
+    print(f"{'telegram calls':<20}" + ", ".join(
+        f"{name} {count}" for name, count in sorted(telegram.counts.items())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=50, help="updates per second")
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--live-share', type=float, default=0.3,
+                        help="share of the chats sharing a live location")
+    parser.add_argument('--latitude', type=float, default=35.69)
+    parser.add_argument('--longitude', type=float, default=51.39)
+    parser.add_argument('--spread', type=float, default=1.0,
+                        help="degrees around the center the chats are spread over")
+    parser.add_argument('--drain', type=float, default=30,
+                        help="seconds to wait for the last answers")
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help="mean seconds per FlightRadar24 request")
+    parser.add_argument('--density', type=float, default=2.0,
+                        help="flights per square degree")
+    parser.add_argument('--global-rate', type=float, default=30)
+    parser.add_argument('--chat-rate', type=float, default=1)
+    parser.add_argument('--chat-burst', type=float, default=3)
+    parser.add_argument('--run-mode', choices=('webhook', 'polling'), default='webhook',
+                        help="how the bot gets the updates")
+    parser.add_argument('--bot-port', type=int, default=8300)
+    parser.add_argument('--flightradar-port', type=int, default=8301)
+    parser.add_argument('--telegram-port', type=int, default=8302)
+    parser.add_argument('--bot-url', help="a bot already running against the stand-ins, "
+                                          "instead of starting one")
+    asyncio.run(load_test(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Memory benchmark of the flight records.
+
+Builds the flight information of ``--number`` copies of the flight of
+``assets/plane_info.json`` with the former dict-of-dicts implementation
+and with ``FlightRecord``, checks both hold the same information and
+reports the memory retained per flight and the time to build it.
+
+Every copy is parsed from JSON like a FlightRadar24 response, so its
+strings are distinct objects, as they are in production. The airport and
+airline names of the records come from the reference index, filled from
+the recorded details payload.
+
+Usage: python3 benchmarks/records_benchmark.py [--number 5000]
+"""
+import argparse
+import ast
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Text
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from fake_flightradar import load_recorded_details  # noqa: E402
+from utils.records import FlightRecord  # noqa: E402
+from utils.reference import get_reference_index  # noqa: E402
+
+
+def load_flight_payload(path: Text = os.path.join(ROOT_DIR, 'assets', 'plane_info.json')
+                        ) -> Text:
+    """Returns the recorded flight as a JSON document."""
+    with open(path) as f:
+        # The asset is a Python literal dump of a FlightRadar24 Flight.
+        return json.dumps(ast.literal_eval(f.read()))
+
+
+def legacy_flight_information(flight: Any, distance: float, bearing: float
+                              ) -> Dict[Text, Any]:
+    """The flight information dict FlightRecord replaced."""
+    aircraft_history = getattr(flight, 'aircraft_history', [])
+    return {
+        'id': flight.id,
+        'number': flight.number,
+        'callsign': flight.callsign,
+        'airline_name': getattr(flight, 'airline_name', 'N/A'),
+        'airline_code': flight.airline_icao,
+        'aircraft_name': getattr(flight, 'aircraft_model', 'N/A'),
+        'aircraft_code': flight.aircraft_code,
+        'aircraft_history': [
+            {
+                'origin_airport': item.get("airport", {}).get(
+                    "origin", {}).get("name", ""),
+                'destination_airport': item.get("airport", {}).get(
+                    "destination", {}).get("name", "")
+            } for item in aircraft_history if item.get("airport", {}) \
+            and item.get("airport", {}).get("origin", {}) \
+            and item.get("airport", {}).get("destination", {})
+        ] if aircraft_history else [],
+        "origin_airport_country_name": getattr(
+            flight, 'origin_airport_country_name', 'N/A'),
+        "origin_airport_country_code": getattr(
+            flight, 'origin_airport_country_code', 'N/A'),
+        "origin_airport_name": getattr(flight, 'origin_airport_name', 'N/A'),
+        "origin_airport_code": flight.origin_airport_iata,
+        "destination_airport_country_name": getattr(
+            flight, 'destination_airport_country_name', 'N/A'),
+        "destination_airport_country_code": getattr(
+            flight, 'destination_airport_country_code', 'N/A'),
+        "destination_airport_name": getattr(
+            flight, 'destination_airport_name', 'N/A'),
+        "destination_airport_code": flight.destination_airport_iata,
+        'altitude': flight.altitude,
+        'heading': flight.heading,
+        'speed': flight.ground_speed,
+        'vertical_speed': flight.vertical_speed,
+        'status': "On Ground" if flight.on_ground else "On Air",
+        'status_text': getattr(flight, 'status_text', 'N/A'),
+        'status_icon': getattr(flight, 'status_icon', 'N/A'),
+        'time_details': getattr(flight, 'time_details', {}),
+        'distance': round(float(distance), 1),
+        'bearing': round(float(bearing)),
+    }
+
+
+def measure(build: Callable[[Any, float, float], Any], payload: Text,
+            number: int) -> List[float]:
+    """Returns the bytes retained per flight and the microseconds spent
+    building each one, parsing excluded."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built, elapsed = [], 0.0
+    for _ in range(number):
+        flight = SimpleNamespace(**json.loads(payload))
+        started = time.perf_counter()
+        built.append(build(flight, 12.345, 271.8))
+        elapsed += time.perf_counter() - started
+        del flight
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return [retained / number, elapsed / number * 1e6]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=5000)
+    args = parser.parse_args()
+
+    get_reference_index().observe(load_recorded_details())
+    payload = load_flight_payload()
+    flight = SimpleNamespace(**json.loads(payload))
+    legacy = legacy_flight_information(flight, 12.345, 271.8)
+    assert FlightRecord.from_flight(flight, 12.345, 271.8).to_dict() == legacy, \
+        "FlightRecord holds different information"
+
+    for name, build in (
+        ('legacy dict', legacy_flight_information),
+        ('FlightRecord', FlightRecord.from_flight),
+    ):
+        retained, elapsed = measure(build, payload, args.number)
+        print(f"{name:>12}: {retained:8.0f} bytes/flight {elapsed:8.2f} µs/flight")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Micro-benchmark of the flight information renderer.
+
+Renders the flight of ``assets/plane_info.json`` with the former
+``flight_information_parser`` implementation and with ``FlightRenderer``,
+checks both outputs are identical and reports the time per render.
+
+Usage: python3 benchmarks/render_benchmark.py [--number 20000]
+"""
+import argparse
+import ast
+import os
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Text
+
+import pytz
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from utils.render import FlightRenderer  # noqa: E402
+
+
+def load_flight_detail(path: Text = os.path.join(ROOT_DIR, 'assets', 'plane_info.json')
+                       ) -> Dict[Text, Any]:
+    """Returns the flight information dict of the recorded flight."""
+    with open(path) as f:
+        # The asset is a Python literal dump of a FlightRadar24 Flight.
+        flight = ast.literal_eval(f.read())
+    return {
+        'id': flight['id'],
+        'number': flight['number'],
+        'callsign': flight['callsign'],
+        'airline_name': flight['airline_name'],
+        'airline_code': flight['airline_icao'],
+        'aircraft_name': flight['aircraft_model'],
+        'aircraft_code': flight['aircraft_code'],
+        'aircraft_history': [
+            {
+                'origin_airport': item['airport']['origin']['name'],
+                'destination_airport': item['airport']['destination']['name'],
+            } for item in flight['aircraft_history']
+            if item.get('airport') and item['airport'].get('origin')
+            and item['airport'].get('destination')
+        ],
+        'origin_airport_country_name': flight['origin_airport_country_name'],
+        'origin_airport_country_code': flight['origin_airport_country_code'],
+        'origin_airport_name': flight['origin_airport_name'],
+        'origin_airport_code': flight['origin_airport_iata'],
+        'destination_airport_country_name': flight['destination_airport_country_name'],
+        'destination_airport_country_code': flight['destination_airport_country_code'],
+        'destination_airport_name': flight['destination_airport_name'],
+        'destination_airport_code': flight['destination_airport_iata'],
+        'altitude': flight['altitude'],
+        'heading': flight['heading'],
+        'speed': flight['ground_speed'],
+        'vertical_speed': flight['vertical_speed'],
+        'status': "On Ground" if flight['on_ground'] else "On Air",
+        'status_text': flight['status_text'],
+        'status_icon': flight['status_icon'],
+        'time_details': flight['time_details'],
+    }
+
+
+def legacy_flight_information_parser(flight_detail: Dict[Text, Any]) -> Text:
+    """The flight_information_parser this renderer replaced."""
+    timezone = pytz.timezone('Asia/Tehran')
+    aircraft_history = "\n".join([
+        f"\t\t\t - <code>{item.get('origin_airport')} -> "\
+                f"{item.get('destination_airport')}</code>"
+        for item in flight_detail.get('aircraft_history', [])
+    ])
+    t_scheduled_departure = flight_detail.get('time_details', {}).get(
+        'scheduled', {}).get('departure', "") if isinstance(
+        flight_detail.get('time_details', {}), dict) \
+        and isinstance(flight_detail.get('time_details', {}).get(
+        'scheduled', {}), dict) else ""
+    t_scheduled_arrival = flight_detail.get('time_details', {}).get(
+        'scheduled', {}).get('arrival', "") if isinstance(
+        flight_detail.get('time_details', {}), dict) \
+        and isinstance(flight_detail.get('time_details', {}).get(
+        'scheduled', {}), dict) else ""
+    t_real_departure = flight_detail.get('time_details', {}).get(
+        'real', {}).get('departure', "") if isinstance(
+        flight_detail.get('time_details', {}), dict) \
+        and isinstance(flight_detail.get('time_details', {}).get(
+        'real', {}), dict) else ""
+    t_real_arrival = flight_detail.get('time_details', {}).get(
+        'real', {}).get('arrival', "") if isinstance(
+        flight_detail.get('time_details', {}), dict) \
+        and isinstance(flight_detail.get('time_details', {}).get(
+        'real', {}), dict) else ""
+    t_estimated_departure = flight_detail.get('time_details', {}).get(
+        'estimated', {}).get('departure', "") if isinstance(
+        flight_detail.get('time_details', {}), dict) \
+        and isinstance(flight_detail.get('time_details', {}).get(
+        'estimated', {}), dict) else ""
+    t_estimated_arrival = flight_detail.get('time_details', {}).get(
+        'estimated', {}).get('arrival', "") if isinstance(
+        flight_detail.get('time_details', {}), dict) \
+        and isinstance(flight_detail.get('time_details', {}).get(
+        'estimated', {}), dict) else ""
+
+    return f"""<b>Flight Information</b>
+<b>Flight ID:</b> {flight_detail.get('id')}
+<b>Flight Number:</b> {flight_detail.get('number')}
+<b>Flight CallSign:</b> {flight_detail.get('callsign')}
+--------------------
+<b>Airline Name:</b> {flight_detail.get('airline_name')} ({flight_detail.get('airline_code')})
+--------------------
+<b>Aircraft Name:</b> {flight_detail.get('aircraft_name')} ({flight_detail.get('aircraft_code')})
+--------------------
+<b>Origin Airport Country Name:</b> {flight_detail.get('origin_airport_country_name')} ({flight_detail.get('origin_airport_country_code')})
+<b>Origin Airport Name:</b> {flight_detail.get('origin_airport_name')} ({flight_detail.get('origin_airport_code')})
+--------------------
+<b>Destination Airport Country Name:</b> {flight_detail.get('destination_airport_country_name')} ({flight_detail.get('destination_airport_country_code')})
+<b>Destination Airport Name:</b> {flight_detail.get('destination_airport_name')} ({flight_detail.get('destination_airport_code')})
+--------------------
+<b>Altitude:</b> {flight_detail.get('altitude')}
+<b>Heading:</b> {flight_detail.get('heading')}
+<b>Speed:</b> {flight_detail.get('speed')}
+<b>Vertical Speed:</b> {flight_detail.get('vertical_speed')}
+<b>Status:</b> {flight_detail.get('status')}
+<b>Status Text:</b> {flight_detail.get('status_text')}
+--------------------
+<b>Time Details:</b>
+    Scheduled: 
+        Departure: <code>{timezone.localize(datetime.fromtimestamp(
+                    int(t_scheduled_departure))).strftime("%Y-%m-%d %H:%M:%S")
+                    if t_scheduled_departure and isinstance(t_scheduled_departure, int) 
+                    else t_scheduled_departure}</code>
+        Arrival: <code>{timezone.localize(datetime.fromtimestamp(
+                    int(t_scheduled_arrival))).strftime("%Y-%m-%d %H:%M:%S")
+                    if t_scheduled_arrival and isinstance(t_scheduled_arrival, int) 
+                    else t_scheduled_arrival}</code>
+    Real:
+        Departure: <code>{datetime.fromtimestamp(
+                    int(t_real_departure)).strftime("%Y-%m-%d %H:%M:%S") 
+                    if t_real_departure and isinstance(t_real_departure, int) 
+                    else t_real_departure}</code>
+        Arrival: <code>{datetime.fromtimestamp(
+                    int(t_real_arrival)).strftime("%Y-%m-%d %H:%M:%S") 
+                    if t_real_arrival and isinstance(t_real_arrival, int) 
+                    else t_real_arrival}</code>
+    Estimated:
+        Departure: <code>{datetime.fromtimestamp(
+                    int(t_estimated_departure)).strftime("%Y-%m-%d %H:%M:%S") 
+                    if t_estimated_departure and isinstance(t_estimated_departure, int) 
+                    else t_estimated_departure}</code>
+        Arrival: <code>{datetime.fromtimestamp(
+                    int(t_estimated_arrival)).strftime("%Y-%m-%d %H:%M:%S") 
+                    if t_estimated_arrival and isinstance(t_estimated_arrival, int) 
+                    else t_estimated_arrival}</code>
+--------------------
+<b>Aircraft History:</b> \n{aircraft_history}
+--------------------
+Powered by <code>FlightRadar24</code>
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000,
+                        help="Renders per measurement.")
+    args = parser.parse_args()
+
+    flight_detail = load_flight_detail()
+    renderer = FlightRenderer()
+    assert renderer.render(flight_detail) == legacy_flight_information_parser(flight_detail), \
+        "The renderer output differs from the legacy parser output."
+
+    for name, render in (
+        ('legacy parser', legacy_flight_information_parser),
+        ('renderer', renderer.render),
+        ('compact renderer', renderer.render_compact),
+    ):
+        seconds = min(timeit.repeat(
+            lambda: render(flight_detail), number=args.number, repeat=5))
+        print(f"{name:>16}: {seconds / args.number * 1e6:8.2f} us per render")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,8 +11,10 @@ class ColoredFormatter(logging.Formatter):
     reset = '\x1b[0m'
     splitter = '\n' + '-' * 100
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, splitter=True, **kwargs):
         super(ColoredFormatter, self).__init__(*args, **kwargs)
+        if not splitter:
+            self.splitter = ''
         self._level_color_format = {
             logging.NOTSET: self.reset + "{}" + self.reset,
             logging.DEBUG: self.grey + "{}" + self.reset,
@@ -31,17 +33,20 @@ class ColoredFormatter(logging.Formatter):
     
 def logger_creator(
         name, 
-        stream_level=logging.DEBUG):
+        stream_level=logging.DEBUG,
+        splitter=True):
     logger = logging.getLogger(name)
     console_format = '[%(levelname)s] %(asctime)s-FILENAME:%(filename)s-MODULE:%(module)s-FUNC:%(funcName)s :: \n%(message)s'
     console_formatter = ColoredFormatter(
         console_format,
-        datefmt='%Y-%m-%d %H:%M:%S')
+        datefmt='%Y-%m-%d %H:%M:%S',
+        splitter=splitter)
     console_handler = logging.StreamHandler()
     logger = logger_settings(
         console_handler, stream_level, console_formatter, logger
     )
-    logger.setLevel(logging.DEBUG)
+    # Records below the stream level are not even created.
+    logger.setLevel(stream_level)
     logger.propagate = False
     return logger
 
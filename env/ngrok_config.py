@@ -1,7 +1,7 @@
 
-import requests
-
 def get_ngrok_public_url(ngrok_url: str):
+    import requests
+
     response = requests.get(ngrok_url)
     if response.status_code == 200:
         return response.json()['tunnels'][0]['public_url']
@@ -9,6 +9,18 @@ def get_ngrok_public_url(ngrok_url: str):
         return None
 
 
+async def async_get_ngrok_public_url(ngrok_url: str, timeout: float = 5):
+    import aiohttp
+
+    async with aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as session:
+        async with session.get(ngrok_url) as response:
+            if response.status == 200:
+                return (await response.json())['tunnels'][0]['public_url']
+            return None
+
+
 def fix_ngrok_configs(APP_ENV_DIR: str):
     import os
     import sys
@@ -1,12 +1,17 @@
 import environ
 from env.logger import logger_creator
-from env.ngrok_config import get_ngrok_public_url
-
-logger = logger_creator('plane_goes_to_bot')
 
 env = environ.Env()
 environ.Env.read_env()
 
+logger = logger_creator(
+    'plane_goes_to_bot',
+    stream_level=env('LOG_LEVEL', default='DEBUG'),
+    splitter=env.bool('LOG_SPLITTER', default=True),
+)
+# Share of the flight payloads logged at DEBUG
+PAYLOAD_LOG_SAMPLE_RATE = env.float('PAYLOAD_LOG_SAMPLE_RATE', default=0.01)
+
 # Network name
 NETWORK_NAME = env('NETWORK_NAME')
 
@@ -15,6 +20,16 @@ APPLICATION_NAME = 'plane_goes_to_bot'
 APPLICATION_PORT = int(env('APPLICATION_PORT'))
 APPLICATION_HOST_NAME = env('APPLICATION_HOST_NAME')
 APPLICATION_HOST = "0.0.0.0"
+# More than one worker process, or remote worker urls, make this process
+# route the updates to the workers by chat. Remote workers run with the
+# 'worker' role, which neither sets the webhook nor polls.
+APPLICATION_WORKERS = env.int('APPLICATION_WORKERS', default=1)
+APPLICATION_WORKER_URLS = env.list('APPLICATION_WORKER_URLS', default=[])
+# Bot workers sharing the Telegram rate, all hosts together, which remote
+# workers must be told to take their share of it
+APPLICATION_WORKER_TOTAL = env.int('APPLICATION_WORKER_TOTAL', default=1)
+APPLICATION_ROLE = env('APPLICATION_ROLE', default='') or (
+    'router' if APPLICATION_WORKERS > 1 or APPLICATION_WORKER_URLS else 'standalone')
 
 # Ngrok information
 NGROK_AUTHTOKEN = env('NGROK_AUTHTOKEN')
@@ -27,12 +42,100 @@ NGROK_VERSION = env('NGROK_VERSION')
 TELEGRAM_BOT_TOKEN = env('TELEGRAM_BOT_TOKEN')
 TELEGRAM_BOT_USERNAME = env('TELEGRAM_BOT_USERNAME')
 TELEGRAM_BOT_WEBHOOK_DISABLE = int(env('TELEGRAM_BOT_WEBHOOK_DISABLE'))
-TELEGRAM_BOT_WEBHOOK_URL = get_ngrok_public_url(
-    ngrok_url=f'http://{NGROK_HOST_NAME}.{NETWORK_NAME}:{NGROK_PORT}/api/tunnels'
-    ) if TELEGRAM_BOT_WEBHOOK_DISABLE else env('TELEGRAM_BOT_WEBHOOK_URL')
-if TELEGRAM_BOT_WEBHOOK_URL and TELEGRAM_BOT_WEBHOOK_URL.endswith('/'):
-    TELEGRAM_BOT_WEBHOOK_URL = TELEGRAM_BOT_WEBHOOK_URL[:-1]
-TELEGRAM_BOT_WEBHOOK_URL = f'{TELEGRAM_BOT_WEBHOOK_URL}/webhooks/telegram/webhook'
+# Either 'webhook' or 'polling', which needs no public url
+TELEGRAM_RUN_MODE = env('TELEGRAM_RUN_MODE', default='webhook')
+TELEGRAM_BOT_WEBHOOK_PATH = '/webhooks/telegram/webhook'
+# The ngrok public url is discovered when the webhook is set, at startup
+NGROK_API_URL = f'http://{NGROK_HOST_NAME}.{NETWORK_NAME}:{NGROK_PORT}/api/tunnels'
+TELEGRAM_BOT_WEBHOOK_URL = '' if TELEGRAM_BOT_WEBHOOK_DISABLE else \
+    env('TELEGRAM_BOT_WEBHOOK_URL', default='').rstrip('/') + TELEGRAM_BOT_WEBHOOK_PATH
+TELEGRAM_SETUP_ATTEMPTS = env.int('TELEGRAM_SETUP_ATTEMPTS', default=10)
+
+# A self-hosted Bot API server, the official one when empty
+TELEGRAM_API_SERVER = env('TELEGRAM_API_SERVER', default='')
+TELEGRAM_BOT_API_URL = f'{TELEGRAM_API_SERVER.rstrip("/") or "https://api.telegram.org"}' \
+    f'/bot{TELEGRAM_BOT_TOKEN}/'
+TELEGRAM_POLLING_BATCH_SIZE = env.int('TELEGRAM_POLLING_BATCH_SIZE', default=100)
+TELEGRAM_POLLING_TIMEOUT = env.int('TELEGRAM_POLLING_TIMEOUT', default=30)
+TELEGRAM_POLLING_OFFSET_PATH = env('TELEGRAM_POLLING_OFFSET_PATH', default='')
+TELEGRAM_GLOBAL_RATE = env.float('TELEGRAM_GLOBAL_RATE', default=30)
+TELEGRAM_CHAT_RATE = env.float('TELEGRAM_CHAT_RATE', default=1)
+TELEGRAM_CHAT_BURST = env.float('TELEGRAM_CHAT_BURST', default=3)
+TELEGRAM_DISPATCHER_WORKERS = env.int('TELEGRAM_DISPATCHER_WORKERS', default=8)
+TELEGRAM_MAX_RETRIES = env.int('TELEGRAM_MAX_RETRIES', default=3)
+
+# Incoming updates, at most one queued per chat
+INGESTION_WORKERS = env.int('INGESTION_WORKERS', default=32)
+INGESTION_QUEUE_SIZE = env.int('INGESTION_QUEUE_SIZE', default=1000)
+INGESTION_BUSY_REPLY_INTERVAL = env.float('INGESTION_BUSY_REPLY_INTERVAL', default=60)
+
+# FlightRadar24 information
+FLIGHT_SEARCH_RADIUS = env.float('FLIGHT_SEARCH_RADIUS', default=50)
+FLIGHT_MAX_RESULTS = env.int('FLIGHT_MAX_RESULTS', default=20)
+FLIGHTRADAR_MAX_WORKERS = env.int('FLIGHTRADAR_MAX_WORKERS', default=16)
+FLIGHTRADAR_DETAILS_CONCURRENCY = env.int('FLIGHTRADAR_DETAILS_CONCURRENCY', default=8)
+FLIGHTRADAR_DETAILS_TIMEOUT = env.float('FLIGHTRADAR_DETAILS_TIMEOUT', default=5.0)
+# A stand-in of the FlightRadar24 endpoints, as in the benchmarks, when set
+FLIGHTRADAR_BASE_URL = env('FLIGHTRADAR_BASE_URL', default='')
+# Request timeouts follow the upstream latency within these bounds
+FLIGHTRADAR_TIMEOUT_MIN = env.float('FLIGHTRADAR_TIMEOUT_MIN', default=1.0)
+FLIGHTRADAR_TIMEOUT_MAX = env.float('FLIGHTRADAR_TIMEOUT_MAX', default=10.0)
+# Failures in a row stopping the requests, and seconds before a new try
+FLIGHTRADAR_BREAKER_FAILURES = env.int('FLIGHTRADAR_BREAKER_FAILURES', default=5)
+FLIGHTRADAR_BREAKER_RESET = env.float('FLIGHTRADAR_BREAKER_RESET', default=30)
+
+# Flight details cache
+FLIGHT_CACHE_BACKEND = env('FLIGHT_CACHE_BACKEND', default='memory')
+FLIGHT_CACHE_REDIS_URL = env('FLIGHT_CACHE_REDIS_URL', default='redis://localhost:6379/0')
+FLIGHT_CACHE_SQLITE_PATH = env('FLIGHT_CACHE_SQLITE_PATH', default='flight_cache.sqlite3')
+FLIGHT_CACHE_LIVE_TTL = env.float('FLIGHT_CACHE_LIVE_TTL', default=60)
+FLIGHT_CACHE_STATIC_TTL = env.float('FLIGHT_CACHE_STATIC_TTL', default=1800)
+FLIGHT_CACHE_MAX_ENTRIES = env.int('FLIGHT_CACHE_MAX_ENTRIES', default=5000)
+FLIGHT_CACHE_MAX_BYTES = env.int('FLIGHT_CACHE_MAX_BYTES', default=64 * 1024 * 1024)
+
+# Airports and airlines seen in the flight details, memory-mapped from the
+# file, which the cached details and the flight records only refer to
+REFERENCE_INDEX_PATH = env('REFERENCE_INDEX_PATH', default='reference.idx')
+REFERENCE_FLUSH_INTERVAL = env.float('REFERENCE_FLUSH_INTERVAL', default=60)
+
+# Flight tiles
+FLIGHT_TILE_SIZE = env.float('FLIGHT_TILE_SIZE', default=1.0)
+FLIGHT_TILE_REFRESH_INTERVAL = env.float('FLIGHT_TILE_REFRESH_INTERVAL', default=10)
+FLIGHT_TILE_MAX_TILES = env.int('FLIGHT_TILE_MAX_TILES', default=1024)
+# Expired tiles are served while refetched, and when refetching fails
+FLIGHT_TILE_STALE_WHILE_REVALIDATE = env.float('FLIGHT_TILE_STALE_WHILE_REVALIDATE', default=10)
+FLIGHT_TILE_STALE_IF_ERROR = env.float('FLIGHT_TILE_STALE_IF_ERROR', default=900)
+
+# Region prewarming
+PREWARM_ENABLED = env.bool('PREWARM_ENABLED', default=True)
+PREWARM_INTERVAL = env.float('PREWARM_INTERVAL', default=8)
+PREWARM_MAX_TILES = env.int('PREWARM_MAX_TILES', default=16)
+PREWARM_UPSTREAM_BUDGET = env.int('PREWARM_UPSTREAM_BUDGET', default=60)
+PREWARM_HALF_LIFE = env.float('PREWARM_HALF_LIFE', default=300)
+PREWARM_MIN_SCORE = env.float('PREWARM_MIN_SCORE', default=2.5)
+
+# Shared state: live sessions and processed updates, shared by the
+# workers with the sqlite or redis backend
+STATE_BACKEND = env('STATE_BACKEND', default='memory')
+STATE_REDIS_URL = env('STATE_REDIS_URL', default=FLIGHT_CACHE_REDIS_URL)
+STATE_SQLITE_PATH = env('STATE_SQLITE_PATH', default='state.sqlite3')
+STATE_MAX_ENTRIES = env.int('STATE_MAX_ENTRIES', default=100000)
+STATE_MAX_BYTES = env.int('STATE_MAX_BYTES', default=64 * 1024 * 1024)
+UPDATE_DEDUP_TTL = env.float('UPDATE_DEDUP_TTL', default=3600)
+
+# Live locations
+LIVE_MOVEMENT_THRESHOLD = env.float('LIVE_MOVEMENT_THRESHOLD', default=500)
+LIVE_REFRESH_INTERVAL = env.float('LIVE_REFRESH_INTERVAL', default=60)
+LIVE_MAX_SESSIONS = env.int('LIVE_MAX_SESSIONS', default=10000)
+LIVE_MAX_FLIGHTS = env.int('LIVE_MAX_FLIGHTS', default=10)
 
-TELEGRAM_BOT_API_URL = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/'
+# Rendering, timestamps are shown in the server local time when empty
+RENDER_TIMEZONE = env('RENDER_TIMEZONE', default='')
+RENDER_LOCAL_TIMES = env.bool('RENDER_LOCAL_TIMES', default=False)
+# New locations get a summary from the feed at once, completed in place
+# as the details of the flights arrive. It pays off when FlightRadar24 is
+# slow, but the edits cost Telegram calls, which slow down a busy bot.
+RENDER_STREAMING = env.bool('RENDER_STREAMING', default=False)
 
+# Timezone lookups, the polygon data is memory-mapped unless kept in memory
+TIMEZONE_IN_MEMORY = env.bool('TIMEZONE_IN_MEMORY', default=False)
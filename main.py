@@ -1,4 +1,58 @@
-from app import PlaneGoesToBot
+import argparse
+import time
+from contextlib import asynccontextmanager
+
+STARTED_AT = time.perf_counter()
+
+# Imported one by one when profiling, heaviest dependencies first.
+PROFILED_IMPORTS = (
+    'env.settings', 'fastapi', 'aiohttp', 'aiogram', 'uvicorn', 'FlightRadar24', 'app',
+)
+
+
+def profile_startup():
+    """Creates the bot phase by phase, and reports the time of every
+    import, of the initialization and of the startup until it serves."""
+    import importlib
+
+    phases = []
+
+    def timed(name, target, *args):
+        started = time.perf_counter()
+        result = target(*args)
+        phases.append((name, time.perf_counter() - started))
+        return result
+
+    for module in PROFILED_IMPORTS:
+        timed(f"import {module}", importlib.import_module, module)
+    application = timed("initialization", importlib.import_module('app').create_application)
+    serving_at = time.perf_counter()
+
+    lifespan = application.rest_api_app.router.lifespan_context
+
+    @asynccontextmanager
+    async def profiled_lifespan(app):
+        from env.settings import logger
+
+        async with lifespan(app):
+            phases.append(("startup", time.perf_counter() - serving_at))
+            report = "\n".join(f"{name:<24}{duration * 1000:9.1f} ms" for name, duration in phases)
+            logger.info(f"Startup profile:\n{report}\n"
+                        f"{'total':<24}{(time.perf_counter() - STARTED_AT) * 1000:9.1f} ms")
+            yield
+
+    application.rest_api_app.router.lifespan_context = profiled_lifespan
+    return application
+
 
 if __name__ == "__main__":
-    PlaneGoesToBot().run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Plane Goes To bot")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="report the time of each startup phase")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup().run()
+    else:
+        from app import create_application
+        create_application().run()
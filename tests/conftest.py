@@ -0,0 +1,17 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Settings the bot requires, only used when missing from the environment.
+for name, value in {
+    'NETWORK_NAME': 'tests',
+    'APPLICATION_PORT': '8000', 'APPLICATION_HOST_NAME': 'localhost',
+    'NGROK_AUTHTOKEN': '-', 'NGROK_HOST_NAME': 'localhost', 'NGROK_PORT': '4040',
+    'NGROK_REGION': 'us', 'NGROK_VERSION': '3',
+    'TELEGRAM_BOT_TOKEN': '123456:' + 'A' * 35,
+    'TELEGRAM_BOT_USERNAME': 'plane_goes_to_bot', 'TELEGRAM_BOT_WEBHOOK_DISABLE': '0',
+    'LOG_LEVEL': 'WARNING',
+}.items():
+    os.environ.setdefault(name, value)
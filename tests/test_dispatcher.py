@@ -0,0 +1,67 @@
+import asyncio
+
+from utils.dispatcher import TelegramDispatcher
+
+
+def test_cancelled_submit_leaves_the_workers_running():
+    async def scenario():
+        dispatcher = TelegramDispatcher(global_rate=1000, chat_rate=1000, chat_burst=1000,
+                                        workers=2)
+        runner = asyncio.create_task(dispatcher.run())
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_call():
+            started.set()
+            await release.wait()
+            return 'late'
+
+        async def failing_call():
+            started.set()
+            await release.wait()
+            raise RuntimeError('late')
+
+        # Both workers are busy with a call whose caller is cancelled.
+        for call in (slow_call, failing_call):
+            started.clear()
+            submit = asyncio.create_task(dispatcher.submit(1, call))
+            await started.wait()
+            submit.cancel()
+            await asyncio.wait({submit})
+            assert submit.cancelled()
+        release.set()
+
+        async def call():
+            return 'sent'
+
+        assert await asyncio.wait_for(dispatcher.submit(1, call), timeout=1) == 'sent'
+        assert await asyncio.wait_for(dispatcher.submit(2, call), timeout=1) == 'sent'
+        assert not runner.done()
+        runner.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_submit_cancelled_before_its_turn_is_not_called_nor_charged():
+    async def scenario():
+        dispatcher = TelegramDispatcher(global_rate=1000, chat_rate=1, chat_burst=1,
+                                        workers=1)
+        runner = asyncio.create_task(dispatcher.run())
+        calls = []
+
+        async def call(name):
+            calls.append(name)
+            return name
+
+        assert await dispatcher.submit(1, lambda: call('first')) == 'first'
+        # Waits a second for the chat rate, and is cancelled meanwhile.
+        submit = asyncio.create_task(dispatcher.submit(1, lambda: call('second')))
+        await asyncio.sleep(0.1)
+        submit.cancel()
+        await asyncio.sleep(1.2)
+        assert calls == ['first']
+        # Its chat slot went back to the chat.
+        assert await asyncio.wait_for(
+            dispatcher.submit(1, lambda: call('third')), timeout=0.3) == 'third'
+        runner.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from utils.cache import FlightDetailsCache, MemoryCacheBackend
+from utils.flight_radar import AsyncFlightRadar24API
+
+
+class Flight(SimpleNamespace):
+
+    def set_flight_details(self, details):
+        self.details = details
+
+
+def slow_api(latency):
+    api = AsyncFlightRadar24API(cache=FlightDetailsCache(MemoryCacheBackend()))
+    lock, calls = threading.Lock(), {'now': 0, 'max': 0}
+
+    def get_flight_details(flight_id, timeout):
+        with lock:
+            calls['now'] += 1
+            calls['max'] = max(calls['max'], calls['now'])
+        time.sleep(latency)
+        with lock:
+            calls['now'] -= 1
+        return {'identification': {'id': flight_id}}
+
+    api._get_flight_details = get_flight_details
+    return api, calls
+
+
+def test_timed_out_lookups_keep_their_slot():
+    async def scenario():
+        api, calls = slow_api(latency=0.3)
+        flights = [Flight(id=str(index)) for index in range(8)]
+        enriched = await api.set_flights_details(flights, concurrency=2, timeout=0.05)
+        while api._details_inflight or api._prefetches:
+            await asyncio.sleep(0.05)
+        api.close()
+        return enriched, calls['max']
+
+    enriched, max_concurrent = asyncio.run(scenario())
+    assert enriched == 0
+    assert max_concurrent == 2
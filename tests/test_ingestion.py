@@ -0,0 +1,24 @@
+import asyncio
+
+from utils.ingestion import UpdateQueue
+from utils.metrics import metrics
+
+
+async def handle(*args):
+    pass
+
+
+def counter(name):
+    return sum(metrics.counters.get(name, {}).values())
+
+
+def test_rejected_and_superseded_updates_are_counted():
+    async def scenario():
+        queue = UpdateQueue(handle, max_size=1)
+        return [queue.submit(1, 'first'), queue.submit(1, 'second'), queue.submit(2, 'other')]
+
+    rejected, superseded = counter("ingestion_rejected"), counter("ingestion_superseded")
+    assert asyncio.run(scenario()) == [True, True, False]
+    assert counter("ingestion_rejected") == rejected + 1
+    assert counter("ingestion_superseded") == superseded + 1
+    assert "plane_goes_to_bot_ingestion_rejected_total" in metrics.render()
@@ -0,0 +1,31 @@
+from utils.prewarm import RegionPoller
+from utils.tiles import FlightTileIndex
+
+BOUNDS = (35.9, 35.1, 51.1, 51.9)
+
+
+def region_poller(**options):
+    return RegionPoller(FlightTileIndex(fr_api=None), **options)
+
+
+def test_a_single_lookup_does_not_make_a_tile_hot():
+    poller = region_poller()
+    poller.record(BOUNDS)
+    assert poller.hot_tiles() == []
+
+
+def test_repeated_lookups_make_a_tile_hot():
+    poller = region_poller()
+    for _ in range(3):
+        poller.record(BOUNDS)
+    assert poller.hot_tiles() == [(35, 51)]
+
+
+def test_tiles_cool_down_when_lookups_stop():
+    poller = region_poller(half_life=0.01)
+    for _ in range(3):
+        poller.record(BOUNDS)
+    poller._scores = {tile: (score, updated_at - 1)
+                      for tile, (score, updated_at) in poller._scores.items()}
+    assert poller.hot_tiles() == []
+    assert poller._scores == {}
@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+from utils.records import FlightRecord
+from utils.reference import Airport, get_reference_index
+
+
+def feed_flight(**fields):
+    flight = dict(
+        id='1', number='IV123', callsign='IRC123', airline_icao='IRC',
+        aircraft_code='F100', origin_airport_iata='THR', destination_airport_iata='MHD',
+        altitude=30000, heading=90, ground_speed=400, vertical_speed=0, on_ground=0)
+    flight.update(fields)
+    return SimpleNamespace(**flight)
+
+
+def test_airport_without_iata_code_falls_back_to_icao():
+    get_reference_index().add(Airport(
+        'OIBK', 'OIBK', 'Kish Island Airport', None, 'Iran', 'IR', None, None, None))
+    record = FlightRecord.from_flight(
+        feed_flight(origin_airport_iata='N/A', origin_airport_icao='OIBK'))
+    assert record.origin_airport_code == 'OIBK'
+    assert record.origin_airport_name == 'Kish Island Airport'
+    assert record.destination_airport_code == 'MHD'
+
+
+def test_airport_without_any_code_stays_unavailable():
+    record = FlightRecord.from_flight(
+        feed_flight(origin_airport_iata='N/A', origin_airport_icao='N/A'))
+    assert record.origin_airport_code == 'N/A'
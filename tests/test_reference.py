@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from utils.reference import Airline, Airport, ReferenceIndex
+
+AIRPORTS = [
+    Airport('THR', 'OIII', 'Mehrabad International Airport', 'Tehran', 'Iran', 'IR',
+            35.689, 51.313, 'Asia/Tehran'),
+    Airport('MHD', 'OIMM', 'Mashhad International Airport', 'Mashhad', 'Iran', 'IR',
+            36.235, 59.641, 'Asia/Tehran'),
+    Airport('IKA', 'OIIE', 'Imam Khomeini International Airport', None, 'Iran', 'IR',
+            35.416, 51.152, None),
+    Airport('OIBK', 'OIBK', 'Kish Island Airport', None, None, None, None, None, None),
+    Airport('DXB', 'OMDB', 'Dubai International Airport', 'Dubai',
+            'United Arab Emirates', 'AE', 25.253, 55.364, 'Asia/Dubai'),
+]
+AIRLINES = [
+    Airline('IRA', 'IR', 'Iran Air', 'Iran Air'),
+    Airline('IRC', 'EP', 'Iran Aseman Airlines', None),
+]
+
+
+def flush(index):
+    return asyncio.run(index.flush())
+
+
+def test_flushed_entries_are_read_back(tmp_path):
+    path = str(tmp_path / 'reference.idx')
+    index = ReferenceIndex(path)
+    for entry in AIRPORTS + AIRLINES:
+        assert index.add(entry)
+    assert flush(index) == len(AIRPORTS + AIRLINES)
+
+    loaded = ReferenceIndex(path)
+    assert len(loaded) == len(AIRPORTS + AIRLINES)
+    for airport in AIRPORTS:
+        assert loaded.airport(airport.code) == airport
+    for airline in AIRLINES:
+        assert loaded.airline(airline.code) == airline
+    assert loaded.airport('AAA') is None
+    assert loaded.airport('ZZZ') is None
+    assert loaded.airline('THR') is None
+
+
+def test_serialized_keys_are_sorted_for_the_binary_search(tmp_path):
+    index = ReferenceIndex()
+    for entry in AIRPORTS:
+        index.add(entry)
+    path = tmp_path / 'reference.idx'
+    path.write_bytes(index.serialize())
+
+    loaded = ReferenceIndex(str(path))
+    codes = sorted(airport.code for airport in AIRPORTS)
+    assert list(loaded._entries('airport')) == [code.encode() for code in codes]
+    assert [loaded._read('airport', code).code for code in codes] == codes
+
+
+def test_flush_merges_the_entries_of_other_processes(tmp_path):
+    path = str(tmp_path / 'reference.idx')
+    first, second = ReferenceIndex(path), ReferenceIndex(path)
+    first.add(AIRPORTS[0])
+    second.add(AIRPORTS[1])
+    second.add(AIRLINES[0])
+    flush(first)
+    flush(second)
+
+    loaded = ReferenceIndex(path)
+    assert loaded.airport('THR') == AIRPORTS[0]
+    assert loaded.airport('MHD') == AIRPORTS[1]
+    assert loaded.airline('IRA') == AIRLINES[0]
+    assert len(loaded) == 3
+
+
+def test_updates_keep_the_known_fields(tmp_path):
+    path = str(tmp_path / 'reference.idx')
+    index = ReferenceIndex(path)
+    index.add(AIRPORTS[2])
+    flush(index)
+
+    loaded = ReferenceIndex(path)
+    assert not loaded.add(AIRPORTS[2]._replace(name=None))
+    assert loaded.add(AIRPORTS[2]._replace(city='Tehran', name=None))
+    flush(loaded)
+    assert ReferenceIndex(path).airport('IKA') == AIRPORTS[2]._replace(city='Tehran')
+
+
+def test_lookups_reload_the_file_when_changed(tmp_path):
+    path = str(tmp_path / 'reference.idx')
+    writer = ReferenceIndex(path)
+    writer.add(AIRPORTS[0])
+    flush(writer)
+    reader = ReferenceIndex(path, reload_interval=0)
+    waiting = ReferenceIndex(path, reload_interval=3600)
+
+    writer.add(AIRPORTS[1])
+    flush(writer)
+    assert reader.airport('MHD') == AIRPORTS[1]
+    assert reader.airport('THR') == AIRPORTS[0]
+    assert waiting.airport('MHD') is None
+
+
+def test_codes_longer_than_a_key_are_not_added():
+    assert not ReferenceIndex().add(AIRLINES[0]._replace(code='TOOLONGCODE'))
+
+
+def test_a_file_of_another_format_is_refused(tmp_path):
+    path = tmp_path / 'reference.idx'
+    path.write_bytes(b'NOTANIDX' + bytes(8))
+    with pytest.raises(ValueError):
+        ReferenceIndex(str(path))
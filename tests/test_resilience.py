@@ -0,0 +1,95 @@
+import pytest
+
+from utils.resilience import AdaptiveTimeout, CircuitBreaker, CircuitOpenError
+
+
+def open_breaker(**options):
+    breaker = CircuitBreaker('get_flights', failure_threshold=3, **options)
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    return breaker
+
+
+def elapse_reset_timeout(breaker):
+    breaker.opened_at -= breaker.reset_timeout
+
+
+def test_the_circuit_opens_after_failures_in_a_row():
+    breaker = CircuitBreaker('get_flights', failure_threshold=3)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_a_half_open_circuit_lets_one_trial_call_through():
+    breaker = open_breaker()
+    elapse_reset_timeout(breaker)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_a_successful_trial_closes_the_circuit():
+    breaker = open_breaker()
+    elapse_reset_timeout(breaker)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_a_failed_trial_opens_the_circuit_again():
+    breaker = open_breaker()
+    elapse_reset_timeout(breaker)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_a_released_trial_lets_another_one_through():
+    breaker = open_breaker()
+    elapse_reset_timeout(breaker)
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_the_timeout_follows_the_latencies():
+    timeout = AdaptiveTimeout(initial=5.0, minimum=1.0, maximum=10.0)
+    assert timeout.value == 5.0
+    timeout.observe(2.0)
+    # The latency plus four times its deviation, half of it at first.
+    assert timeout.value == 6.0
+    for _ in range(50):
+        timeout.observe(0.1)
+    assert timeout.value == 1.0
+
+
+def test_timeouts_back_off_until_a_request_succeeds():
+    timeout = AdaptiveTimeout(initial=2.0, minimum=1.0, maximum=10.0)
+    timeout.timed_out()
+    assert timeout.value == 4.0
+    timeout.timed_out()
+    timeout.timed_out()
+    assert timeout.value == 10.0
+    backoff = timeout.backoff
+    timeout.timed_out()
+    assert timeout.backoff == backoff
+
+    timeout.observe(1.0)
+    assert timeout.backoff == 1
+    assert timeout.value == 3.0
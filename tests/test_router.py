@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from utils.router import WEBHOOK_PATH, UpdateRouter, WorkerUnavailableError
+
+
+async def start_worker(name, status=200):
+    received = []
+
+    async def webhook(request):
+        received.append((await request.json())['update_id'])
+        return web.json_response({"ok": True, "description": name}, status=status)
+
+    application = web.Application()
+    application.router.add_post(WEBHOOK_PATH, webhook)
+    runner = web.AppRunner(application)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}", runner, received
+
+
+def update(update_id, chat_id):
+    return {'update_id': update_id, 'message': {'chat': {'id': chat_id}}}
+
+
+def test_updates_of_a_failed_worker_go_to_the_next_one():
+    async def scenario():
+        failing_url, failing, failed = await start_worker('failing', status=500)
+        working_url, working, received = await start_worker('working')
+        router = UpdateRouter([failing_url, working_url])
+        try:
+            # Chat 0 belongs to the failing worker, chat 1 to the working one.
+            answers = [await router.forward(update(1, 0)), await router.forward(update(2, 1))]
+        finally:
+            await router.close()
+            await failing.cleanup()
+            await working.cleanup()
+        return answers, failed, received
+
+    answers, failed, received = asyncio.run(scenario())
+    assert answers == [(True, 'working'), (True, 'working')]
+    assert failed == [1]
+    assert received == [1, 2]
+
+
+def test_an_update_no_worker_processed_raises():
+    async def scenario():
+        url, runner, _ = await start_worker('failing', status=500)
+        router = UpdateRouter([url, 'http://127.0.0.1:9'], timeout=1)
+        try:
+            await router.forward(update(1, 0))
+        finally:
+            await router.close()
+            await runner.cleanup()
+
+    with pytest.raises(WorkerUnavailableError):
+        asyncio.run(scenario())
@@ -0,0 +1,44 @@
+import asyncio
+
+from FlightRadar24.entities.flight import Flight
+
+from utils.cache import MemoryCacheBackend
+from utils.tiles import FlightTileIndex
+
+BOUNDS = (35.9, 35.1, 51.1, 51.9)
+
+
+class FeedAPI:
+    """Serves one flight per tile and counts the feed requests."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def get_flights(self, bounds):
+        self.calls += 1
+        return [Flight('2f1a', [
+            '7304C1', 35.5, 51.5, 90, 30000, 420, '1234', 'F', 'A320', 'EP-ABC',
+            1700000000, 'THR', 'MHD', 'IV123', 0, 0, 'IRC123', 0, 'IRC'])]
+
+
+def test_workers_sharing_a_backend_fetch_a_tile_once():
+    async def scenario():
+        fr_api, backend = FeedAPI(), MemoryCacheBackend()
+        workers = [FlightTileIndex(fr_api, backend=backend) for _ in range(3)]
+        flights = [await worker.get_flights(BOUNDS) for worker in workers]
+        return fr_api.calls, flights
+
+    calls, flights = asyncio.run(scenario())
+    assert calls == 1
+    for worker_flights in flights:
+        assert [(flight.id, flight.callsign, flight.latitude) for flight in worker_flights] \
+            == [('2f1a', 'IRC123', 35.5)]
+
+
+def test_a_tile_is_refreshed_by_one_worker_per_period():
+    async def scenario():
+        backend = MemoryCacheBackend()
+        workers = [FlightTileIndex(FeedAPI(), backend=backend) for _ in range(3)]
+        return [await worker.claim_refresh((35, 51), period=8) for worker in workers]
+
+    assert asyncio.run(scenario()) == [True, False, False]
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from utils.metrics import metrics
+from utils.reference import compact_details
+
+
+class CacheBackend:
+    """Storage interface of the caches and of the shared bot state.
+
+    Values must be JSON serializable so that they can be shared between
+    several bot workers or replicas by an out-of-process backend.
+    """
+
+    async def get(self, key: Text) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: Text, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def add(self, key: Text, value: Any, ttl: float) -> bool:
+        """Sets the key only if it is not set yet, and tells whether it was."""
+        raise NotImplementedError
+
+    async def delete(self, key: Text) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU cache with per entry expiry and a memory cap.
+
+    The size of an entry is estimated from its JSON encoding when it is
+    stored; the least recently used entries are evicted once either
+    ``max_entries`` or ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Text, Tuple[float, int, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: Text) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: Text, value: Any, ttl: float) -> None:
+        self._pop(key)
+        size = len(json.dumps(value, default=str))
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self.size += size
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.size > self.max_bytes
+        ):
+            self._pop(next(iter(self._entries)))
+
+    async def add(self, key: Text, value: Any, ttl: float) -> bool:
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: Text) -> None:
+        self._pop(key)
+
+    def _pop(self, key: Text) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis backed cache, shared by every bot replica.
+
+    Needs the optional ``redis`` package.
+    """
+
+    def __init__(self, url: Text, prefix: Text = "plane_goes_to_bot:") -> None:
+        try:
+            from redis import asyncio as redis
+        except ImportError as e:
+            raise ImportError(
+                "The redis cache backend needs the redis package: "
+                "pip install redis") from e
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: Text) -> Optional[Any]:
+        value = await self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: Text, value: Any, ttl: float) -> None:
+        await self.client.set(
+            self.prefix + key, json.dumps(value, default=str), px=int(ttl * 1000))
+
+    async def add(self, key: Text, value: Any, ttl: float) -> bool:
+        return bool(await self.client.set(
+            self.prefix + key, json.dumps(value, default=str),
+            px=int(ttl * 1000), nx=True))
+
+    async def delete(self, key: Text) -> None:
+        await self.client.delete(self.prefix + key)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """SQLite backed cache, shared by the bot workers of a host.
+
+    The database runs in WAL mode, so the workers read while one of them
+    writes. Queries run in the default executor, expired entries are
+    purged every ``purge_interval`` writes.
+    """
+
+    def __init__(self, path: Text, purge_interval: int = 1000) -> None:
+        self.path = path
+        self.purge_interval = purge_interval
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _execute(self, query: Text, *parameters: Any) -> Tuple[List[Tuple], int]:
+        with self._lock:
+            cursor = self._connection.execute(query, parameters)
+            return cursor.fetchall(), cursor.rowcount
+
+    async def _run(self, query: Text, *parameters: Any) -> Tuple[List[Tuple], int]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._execute, query, *parameters)
+
+    async def _write(self, query: Text, *parameters: Any) -> int:
+        self._writes += 1
+        if self._writes % self.purge_interval == 0:
+            await self._run("DELETE FROM entries WHERE expires_at <= ?", time.time())
+        return (await self._run(query, *parameters))[1]
+
+    async def get(self, key: Text) -> Optional[Any]:
+        rows, _ = await self._run(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+            key, time.time())
+        return json.loads(rows[0][0]) if rows else None
+
+    async def set(self, key: Text, value: Any, ttl: float) -> None:
+        await self._write(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+            key, json.dumps(value, default=str), time.time() + ttl)
+
+    async def add(self, key: Text, value: Any, ttl: float) -> bool:
+        # Takes over the key when it expired, atomically.
+        now = time.time()
+        return await self._write(
+            "INSERT INTO entries (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE entries.expires_at <= ?",
+            key, json.dumps(value, default=str), now + ttl, now) > 0
+
+    async def delete(self, key: Text) -> None:
+        await self._write("DELETE FROM entries WHERE key = ?", key)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def create_cache_backend(
+    name: Text, max_entries: int, max_bytes: int, url: Optional[Text] = None,
+    path: Optional[Text] = None
+) -> CacheBackend:
+    """Creates the cache backend selected in the settings."""
+    if name == "memory":
+        return MemoryCacheBackend(max_entries=max_entries, max_bytes=max_bytes)
+    if name == "redis":
+        return RedisCacheBackend(url)
+    if name == "sqlite":
+        return SQLiteCacheBackend(path)
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+class FlightDetailsCache:
+    """Cache of FlightRadar24 flight details payloads keyed by flight id.
+
+    A payload is split in two parts with their own lifetimes: the route
+    (aircraft, airline, airports, history and scheduled times) which holds
+    for the whole flight, and the status (status text, real and estimated
+    times) which changes along it. The route is kept ``static_ttl``
+    seconds. The status is due for a refresh after ``live_ttl`` seconds,
+    but the last known one is kept as long as the route, so a flight keeps
+    its latest status while it is refreshed. The rest of the payload, as
+    the trail, is not kept. With ``compact``, the route only keeps the
+    codes of the airports and airline, whose names are in the reference
+    index.
+    """
+
+    STATIC_FIELDS = (
+        'identification', 'aircraft', 'airline', 'owner', 'airport', 'flightHistory',
+    )
+    LIVE_FIELDS = ('status', 'time')
+    # Times of the route, the other ones belong to the status.
+    STATIC_TIMES = ('scheduled',)
+
+    def __init__(self, backend: CacheBackend, live_ttl: float = 60,
+                 static_ttl: float = 1800, compact: bool = False) -> None:
+        self.backend = backend
+        self.compact = compact
+        self.live_ttl = live_ttl
+        self.static_ttl = static_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get(self, flight_id: Text) -> Tuple[Optional[Dict[Any, Any]], bool]:
+        """Returns the details payload, if its route is known, and whether
+        its status is fresh."""
+        static = await self.backend.get(f"details:static:{flight_id}")
+        if static is None:
+            self.misses += 1
+            metrics.increment("flight_cache_lookups", result="miss")
+            return None, False
+        live = await self.backend.get(f"details:live:{flight_id}") or {}
+        fresh = time.time() - live.get('fetched_at', 0) < self.live_ttl
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        metrics.increment("flight_cache_lookups", result="hit" if fresh else "stale")
+        details = {key: value for key, value in live.items() if key != 'fetched_at'}
+        details.update(static)
+        details['time'] = {**static.get('time', {}), **live.get('time', {})}
+        return details, fresh
+
+    async def contains(self, flight_id: Text) -> bool:
+        """Tells whether the route is known, without counting a lookup."""
+        return await self.backend.get(f"details:static:{flight_id}") is not None
+
+    async def set(self, flight_id: Text, details: Dict[Any, Any]) -> None:
+        static = {key: details[key] for key in self.STATIC_FIELDS if key in details}
+        live = {key: details[key] for key in self.LIVE_FIELDS if key in details}
+        times = live.pop('time', None)
+        if isinstance(times, dict):
+            static['time'] = {key: value for key, value in times.items()
+                              if key in self.STATIC_TIMES}
+            live['time'] = {key: value for key, value in times.items()
+                            if key not in self.STATIC_TIMES}
+        if self.compact:
+            static = compact_details(static)
+        live['fetched_at'] = time.time()
+        await self.backend.set(f"details:static:{flight_id}", static, self.static_ttl)
+        await self.backend.set(f"details:live:{flight_id}", live, self.static_ttl)
+
+    def stats(self) -> Dict[Text, int]:
+        """Returns the hit and miss counters."""
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,180 @@
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Text
+
+from aiogram.utils.exceptions import RetryAfter
+
+from env.settings import logger
+from utils.metrics import metrics
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class TokenBucket:
+    """Token bucket refilled with ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """Takes a token and returns how many seconds to wait before using it.
+
+        Tokens may be borrowed in advance, so successive reservations get
+        increasing delays and keep their order.
+        """
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self) -> None:
+        """Gives back a token reserved for a call which was not made."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def pause(self, seconds: float) -> None:
+        """Holds back the next tokens for the given seconds."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    @property
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class OutboundRequest:
+    """A Telegram call waiting in the dispatcher queue."""
+
+    def __init__(self, chat_id: Any, call: Callable[[], Awaitable[Any]]) -> None:
+        self.chat_id = chat_id
+        self.call = call
+        self.future = asyncio.get_running_loop().create_future()
+        self.reserved = False
+        self.retries = 0
+
+
+class TelegramDispatcher:
+    """Rate limited queue of the outbound Telegram calls.
+
+    Calls go through a global token bucket (``global_rate`` per second) and
+    a token bucket per chat (``chat_rate`` per second, bursts of
+    ``chat_burst``). Message edits are sent before new messages. A 429
+    response pauses the chat for its ``retry_after`` and the call is
+    retried up to ``max_retries`` times.
+    """
+
+    PRIORITY_EDIT = 0
+    PRIORITY_SEND = 1
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1,
+                 chat_burst: float = 3, workers: int = 8, max_retries: int = 3,
+                 max_chat_buckets: int = 10000) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+
+    @property
+    def pending(self) -> int:
+        """Number of calls waiting in the queue."""
+        return self._queue.qsize()
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.max_chat_buckets:
+                # Full buckets hold no state worth keeping.
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items()
+                    if not value.full}
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _put(self, priority: int, sequence: int, request: OutboundRequest) -> None:
+        self._queue.put_nowait((priority, sequence, request))
+
+    async def submit(self, chat_id: Any, call: Callable[[], Awaitable[Any]],
+                     priority: int = PRIORITY_SEND) -> Any:
+        """Queues a Telegram call and returns its result once sent."""
+        request = OutboundRequest(chat_id, call)
+        self._put(priority, next(self._sequence), request)
+        return await request.future
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            priority, sequence, request = await self._queue.get()
+            if request.future.done():
+                # Cancelled by its caller, its chat slot goes to the next call.
+                if request.reserved:
+                    self._chat_bucket(request.chat_id).refund()
+                continue
+
+            if not request.reserved:
+                request.reserved = True
+                if (delay := self._chat_bucket(request.chat_id).reserve()) > 0:
+                    loop.call_later(delay, self._put, priority, sequence, request)
+                    continue
+            await asyncio.sleep(self.global_bucket.reserve())
+            if request.future.done():
+                # Cancelled by its caller while waiting for its turn.
+                self._chat_bucket(request.chat_id).refund()
+                self.global_bucket.refund()
+                continue
+
+            try:
+                with metrics.span("telegram_call"):
+                    result = await request.call()
+            except RetryAfter as e:
+                metrics.increment("telegram_retry_after")
+                request.retries += 1
+                if request.retries > self.max_retries:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                    continue
+                logger.warning(f"Telegram flood control on {request.chat_id}, "
+                               f"retrying in {e.timeout} seconds.")
+                self._chat_bucket(request.chat_id).pause(e.timeout)
+                request.reserved = False
+                loop.call_later(e.timeout, self._put, priority, sequence, request)
+            except Exception as e:
+                metrics.increment("telegram_errors")
+                # The caller may have been cancelled during the call.
+                if not request.future.done():
+                    request.future.set_exception(e)
+            else:
+                if not request.future.done():
+                    request.future.set_result(result)
+
+    async def run(self) -> None:
+        """Sends the queued calls, forever."""
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+
+
+def merge_messages(texts: List[Text], separator: Text = "\n\n",
+                   limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[Text]:
+    """Joins texts into as few messages as the Telegram size limit allows."""
+    messages, current = [], ""
+    for text in texts:
+        if current and len(current) + len(separator) + len(text) <= limit:
+            current += separator + text
+            continue
+        if current:
+            messages.append(current)
+        current = text
+    if current:
+        messages.append(current)
+    return messages
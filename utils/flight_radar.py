@@ -0,0 +1,343 @@
+import asyncio
+import dataclasses
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Text, Tuple, Union
+
+import requests
+from FlightRadar24.api import FlightRadar24API
+from FlightRadar24.core import Core
+from FlightRadar24.entities.flight import Flight
+from FlightRadar24.errors import CloudflareError
+from requests.adapters import HTTPAdapter
+
+from env.settings import logger
+from utils.cache import FlightDetailsCache
+from utils.metrics import metrics
+from utils.reference import ReferenceIndex
+from utils.resilience import AdaptiveTimeout, CircuitBreaker, CircuitOpenError
+
+METHODS = ('get_flights', 'get_flight_details')
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Returns whether an error tells the upstream is degraded, unlike
+    the lookup of a flight which no longer exists."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code not in (400, 404)
+    return True
+
+
+class AsyncFlightRadar24API:
+    """Non-blocking FlightRadar24 client.
+
+    The FlightRadar24 SDK only ships blocking calls, so every request is
+    offloaded to a bounded thread pool and awaited from the event loop.
+    Flight details are served from ``cache`` when it is given, and
+    concurrent lookups of the same flight share one in-flight request.
+    The airports and airlines of the fetched details are added to the
+    ``reference`` index when it is given.
+    A ``base_url`` replaces the FlightRadar24 hosts of the feed and of the
+    flight details, to run against a local stand-in.
+
+    The feed and the details are requested through one keep-alive
+    connection pool rather than the SDK, which opens a connection per
+    request. Each of them has a timeout adapted to its latency, and a
+    circuit breaker failing its requests fast while the upstream is down.
+    """
+
+    def __init__(self, max_workers: int = 16,
+                 cache: Optional[FlightDetailsCache] = None,
+                 reference: Optional[ReferenceIndex] = None,
+                 base_url: Text = '', timeout_min: float = 1.0,
+                 timeout_max: float = 10.0, breaker_failures: int = 5,
+                 breaker_reset: float = 30) -> None:
+        if base_url:
+            # The SDK reads its urls from the Core class at request time.
+            base_url = base_url.rstrip('/')
+            Core.real_time_flight_tracker_data_url = base_url + "/zones/fcgi/feed.js"
+            Core.flight_data_url = base_url + "/clickhandler/?flight={}"
+        self.fr_api = FlightRadar24API()
+        self.session = requests.Session()
+        self.session.headers.update(Core.json_headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.timeouts = {
+            method: AdaptiveTimeout(timeout_max / 2, timeout_min, timeout_max)
+            for method in METHODS}
+        self.breakers = {
+            method: CircuitBreaker(method, breaker_failures, breaker_reset)
+            for method in METHODS}
+        self.cache = cache
+        self.reference = reference
+        self._details_inflight: Dict[Text, asyncio.Task] = {}
+        self._prefetches: Set[asyncio.Task] = set()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="flightradar24")
+
+    async def run(self, target: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Runs a blocking callable on the FlightRadar24 thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(target, *args, **kwargs))
+
+    async def request(self, name: Text, target: Callable[..., Any],
+                      *args: Any) -> Any:
+        """Runs an upstream request, timed and counted under ``name``.
+
+        ``target`` is called with the arguments and the timeout of the
+        request. Raises ``CircuitOpenError`` without calling it while the
+        circuit of ``name`` is open.
+        """
+        breaker, timeout = self.breakers[name], self.timeouts[name]
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            metrics.increment("upstream_rejected", method=name)
+            raise
+
+        metrics.increment("upstream_requests", method=name)
+        started = time.perf_counter()
+        try:
+            with metrics.span(name):
+                result = await self.run(target, *args, timeout=timeout.value)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            metrics.increment("upstream_errors", method=name)
+            if isinstance(e, requests.Timeout):
+                metrics.increment("upstream_timeouts", method=name)
+                timeout.timed_out()
+            if is_upstream_failure(e):
+                breaker.record_failure()
+                if breaker.state == CircuitBreaker.OPEN:
+                    logger.warning(f"FlightRadar24 {name} circuit opened: {e}")
+            else:
+                breaker.record_success()
+            raise
+        timeout.observe(time.perf_counter() - started)
+        breaker.record_success()
+        return result
+
+    def _get(self, url: Text, timeout: float, params: Optional[Dict] = None) -> Any:
+        response = self.session.get(url, params=params, timeout=timeout)
+        if response.status_code == 520:
+            raise CloudflareError(
+                message="An unexpected error has occurred. "
+                        "Perhaps you are making too many calls?",
+                response=response)
+        response.raise_for_status()
+        return response.json()
+
+    def _get_flights(self, bounds: Text, timeout: float) -> List[Flight]:
+        params = dataclasses.asdict(self.fr_api.get_flight_tracker_config())
+        params["bounds"] = bounds
+        payload = self._get(Core.real_time_flight_tracker_data_url, timeout, params)
+        # The other keys are the feed metadata, as its version.
+        return [Flight(flight_id, flight_info) for flight_id, flight_info in payload.items()
+                if flight_id[0].isnumeric()]
+
+    def _get_flight_details(self, flight_id: Text, timeout: float) -> Dict[Any, Any]:
+        return self._get(Core.flight_data_url.format(flight_id), timeout)
+
+    async def get_flights(self, bounds: Text) -> List[Flight]:
+        """Returns the flights inside the given bounds."""
+        return await self.request("get_flights", self._get_flights, bounds)
+
+    async def get_flight_details(self, flight: Union[Flight, Text]) -> Dict[Any, Any]:
+        """Returns the full details payload of a flight."""
+        flight_id = flight.id if isinstance(flight, Flight) else flight
+        return await self.request("get_flight_details", self._get_flight_details, flight_id)
+
+    def fetch_flight_details(self, flight_id: Text) -> asyncio.Task:
+        """Returns the in-flight details lookup of a flight, starting it if needed.
+
+        The fetched payload is stored in the cache.
+        """
+        task = self._details_inflight.get(flight_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch_flight_details(flight_id))
+            self._details_inflight[flight_id] = task
+            task.add_done_callback(
+                lambda done: self._details_task_done(flight_id, done))
+        return task
+
+    async def _fetch_flight_details(self, flight_id: Text) -> Dict[Any, Any]:
+        details = await self.get_flight_details(flight_id)
+        if self.reference is not None:
+            self.reference.observe(details)
+        if self.cache is not None:
+            await self.cache.set(flight_id, details)
+        return details
+
+    def _details_task_done(self, flight_id: Text, task: asyncio.Task) -> None:
+        self._details_inflight.pop(flight_id, None)
+        # Retrieved so that a lookup nobody waited for anymore does not
+        # log an unhandled exception.
+        if not task.cancelled():
+            task.exception()
+
+    async def cached_flight_details(
+        self, flight_id: Text
+    ) -> Tuple[Optional[Dict[Any, Any]], bool]:
+        """Returns the cached details of a flight, if any, and whether their
+        status is fresh.
+
+        Full payloads, as written by other processes sharing the cache, add
+        their airports and airline to the reference index.
+        """
+        if self.cache is None:
+            return None, False
+        details, fresh = await self.cache.get(flight_id)
+        if details is not None and not self.cache.compact and self.reference is not None:
+            self.reference.observe(details)
+        return details, fresh
+
+    async def bounded_fetch_flight_details(
+        self, flight_id: Text, semaphore: asyncio.Semaphore
+    ) -> Dict[Any, Any]:
+        """Returns the details of a flight, starting their lookup once
+        ``semaphore`` lets it, unless it is already in flight."""
+        task = self._details_inflight.get(flight_id)
+        if task is None:
+            async with semaphore:
+                # Shielded, so that a caller giving up leaves the lookup
+                # to fill the cache.
+                return await asyncio.shield(self.fetch_flight_details(flight_id))
+        return await asyncio.shield(task)
+
+    def prefetch_flight_details(self, flight_id: Text, semaphore: asyncio.Semaphore) -> None:
+        """Fetches the details of a flight in the background, once
+        ``semaphore`` lets it."""
+        if flight_id in self._details_inflight:
+            return
+        task = asyncio.ensure_future(self.bounded_fetch_flight_details(flight_id, semaphore))
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetch_done)
+
+    def _prefetch_done(self, task: asyncio.Task) -> None:
+        self._prefetches.discard(task)
+        if not task.cancelled():
+            task.exception()
+
+    async def set_flights_details(
+        self, flights: List[Flight], concurrency: int = 8, timeout: float = 5.0,
+        wait: bool = True
+    ) -> int:
+        """Sets the details of many flights, from the cache when known.
+
+        Flights whose route is cached get it at once, with their last known
+        status, which is refreshed in the background when due. The details
+        of the other flights, new in the area, are fetched in the
+        background too. At most ``concurrency`` of the lookups a call starts
+        run at once. With ``wait``, the new flights wait ``timeout`` seconds
+        for their lookup once started; without, they keep the data of their
+        feed row until a later call. Returns the number of flights given
+        details.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def set_flight_details(flight: Flight) -> bool:
+            details, fresh = await self.cached_flight_details(flight.id)
+            if details is not None:
+                if not fresh:
+                    self.prefetch_flight_details(flight.id, semaphore)
+                flight.set_flight_details(details)
+                return True
+
+            if not wait:
+                self.prefetch_flight_details(flight.id, semaphore)
+                return False
+            # Tracked as a prefetch, so that a lookup outliving its timeout
+            # keeps its slot until it completes.
+            task = asyncio.ensure_future(
+                self.bounded_fetch_flight_details(flight.id, semaphore))
+            self._prefetches.add(task)
+            task.add_done_callback(self._prefetch_done)
+            try:
+                details = await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+            except asyncio.TimeoutError:
+                metrics.increment("upstream_timeouts", method="get_flight_details")
+                logger.warning(f"Flight details timed out: {flight.id}")
+                return False
+            except CircuitOpenError:
+                return False
+            except Exception as e:
+                logger.warning(f"Failed to get flight details of {flight.id}: {e}")
+                return False
+
+            flight.set_flight_details(details)
+            return True
+
+        results = await asyncio.gather(
+            *(set_flight_details(flight) for flight in flights))
+        return sum(results)
+
+    async def stream_flights_details(
+        self, flights: List[Flight], concurrency: int = 8, timeout: float = 5.0
+    ) -> AsyncIterator[List[Flight]]:
+        """Sets the details of many flights, yielding them as they get them.
+
+        The flights with cached details come first, in one batch which may
+        be empty. The others follow as their lookups complete, the ones
+        completed together in one batch. At most ``concurrency`` lookups
+        run at once. Once ``timeout`` seconds are over, or the stream is
+        closed, the lookups started complete in the background and the
+        other ones are dropped.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks: Dict[asyncio.Future, Flight] = {}
+        cached = []
+        for flight in flights:
+            details, fresh = await self.cached_flight_details(flight.id)
+            if details is None:
+                tasks[asyncio.ensure_future(
+                    self.bounded_fetch_flight_details(flight.id, semaphore))] = flight
+                continue
+            if not fresh:
+                self.prefetch_flight_details(flight.id, semaphore)
+            flight.set_flight_details(details)
+            cached.append(flight)
+
+        try:
+            yield cached
+            deadline = time.monotonic() + timeout
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(0.0, deadline - time.monotonic()),
+                    return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    metrics.increment("upstream_timeouts", method="get_flight_details",
+                                      value=len(tasks))
+                    logger.warning(f"Flight details timed out: {len(tasks)} flights.")
+                    return
+                enriched = []
+                for task in done:
+                    flight = tasks.pop(task)
+                    if task.cancelled():
+                        continue
+                    if (error := task.exception()) is not None:
+                        if not isinstance(error, CircuitOpenError):
+                            logger.warning(
+                                f"Failed to get flight details of {flight.id}: {error}")
+                        continue
+                    flight.set_flight_details(task.result())
+                    enriched.append(flight)
+                if enriched:
+                    yield enriched
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[Text, Any]:
+        """Returns the circuit state and the timeout of each request."""
+        return {method: {'circuit': self.breakers[method].state,
+                         **self.timeouts[method].stats()} for method in METHODS}
+
+    def close(self) -> None:
+        """Stops the thread pool, dropping the pending requests."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
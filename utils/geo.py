@@ -0,0 +1,77 @@
+import math
+from typing import TYPE_CHECKING, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+Bounds = Tuple[float, float, float, float]
+
+
+def bounding_box(latitude: float, longitude: float, distance_km: float) -> Bounds:
+    """Returns the (north, south, west, east) bounds of a circle.
+
+    Closed-form on a spherical earth: the longitude span is the one of the
+    circle's widest parallel, so the box fully covers the circle. Boxes
+    crossing the antimeridian have their west edge east of their east edge.
+    """
+    angle = distance_km / EARTH_RADIUS_KM
+    lat = math.radians(latitude)
+    north = math.degrees(lat + angle)
+    south = math.degrees(lat - angle)
+    if north >= 90 or south <= -90:
+        # The circle contains a pole, every longitude is covered.
+        return min(north, 90.0), max(south, -90.0), -180.0, 180.0
+
+    delta = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(lat))))
+    west = (longitude - delta + 180) % 360 - 180
+    east = (longitude + delta + 180) % 360 - 180
+    return north, south, west, east
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Returns the great-circle distance between two points in kilometers."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def distances_and_bearings(
+    latitude: float, longitude: float,
+    latitudes: Sequence[float], longitudes: Sequence[float]
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Returns the distances in kilometers and the initial bearings in
+    degrees from one point to many, computed in one vectorized pass."""
+    # Imported on first use, it is the slowest import of the bot.
+    import numpy as np
+
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    dlon = np.radians(np.asarray(longitudes, dtype=np.float64)) - lon1
+
+    cos_lat2 = np.cos(lat2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * cos_lat2 * np.sin(dlon / 2) ** 2
+    distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    bearings = np.degrees(np.arctan2(
+        np.sin(dlon) * cos_lat2,
+        math.cos(lat1) * np.sin(lat2) - math.sin(lat1) * cos_lat2 * np.cos(dlon),
+    )) % 360
+    return distances, bearings
+
+
+def nearest(latitude: float, longitude: float, latitudes: Sequence[float],
+            longitudes: Sequence[float], radius_km: float, limit: int
+            ) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Returns the indices, distances and bearings of the at most ``limit``
+    points within ``radius_km``, nearest first."""
+    import numpy as np
+
+    distances, bearings = distances_and_bearings(
+        latitude, longitude, latitudes, longitudes)
+    inside = np.flatnonzero(distances <= radius_km)
+    order = inside[np.argsort(distances[inside], kind='stable')][:limit]
+    return order, distances[order], bearings[order]
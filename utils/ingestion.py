@@ -0,0 +1,105 @@
+import asyncio
+import collections
+import time
+from typing import Any, Awaitable, Callable, Dict, Set, Tuple
+
+from env.settings import logger
+from utils.metrics import metrics
+
+
+class UpdateQueue:
+    """Bounded queue of the incoming updates, processed by a worker pool.
+
+    At most one update per chat is queued: a newer update of a chat
+    replaces its queued one, which is never processed. The updates of a
+    chat are processed one at a time, in order. When ``max_size`` chats
+    are waiting, new updates are rejected and the caller sheds them.
+    """
+
+    def __init__(self, handler: Callable[..., Awaitable[Any]], workers: int = 32,
+                 max_size: int = 1000, wait_samples: int = 1024) -> None:
+        self.handler = handler
+        self.workers = workers
+        self.max_size = max_size
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Dict[Any, Tuple[Tuple[Any, ...], float]] = {}
+        self._active: Set[Any] = set()
+        self._deferred: Set[Any] = set()
+        self._waits: collections.deque = collections.deque(maxlen=wait_samples)
+        self.processed = 0
+        self.superseded = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of chats with a queued update."""
+        return len(self._pending)
+
+    def submit(self, chat_id: Any, *args: Any) -> bool:
+        """Queues ``handler(*args)`` for a chat.
+
+        Returns False when the queue is full and the update was rejected.
+        """
+        if chat_id in self._pending:
+            # Keep the queue position, but only the latest update.
+            self._pending[chat_id] = (args, self._pending[chat_id][1])
+            self.superseded += 1
+            metrics.increment("ingestion_superseded")
+            return True
+        if len(self._pending) >= self.max_size:
+            self.rejected += 1
+            metrics.increment("ingestion_rejected")
+            return False
+        self._pending[chat_id] = (args, time.monotonic())
+        self._queue.put_nowait(chat_id)
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id = await self._queue.get()
+            if chat_id in self._active:
+                # Requeued once the running update of the chat is done.
+                self._deferred.add(chat_id)
+                continue
+            if (pending := self._pending.pop(chat_id, None)) is None:
+                continue
+
+            args, queued_at = pending
+            self._waits.append(time.monotonic() - queued_at)
+            self._active.add(chat_id)
+            try:
+                await self.handler(*args)
+            except Exception as e:
+                self.failed += 1
+                logger.exception(f"Failed to process update of {chat_id}: {e}")
+            finally:
+                self.processed += 1
+                self._active.discard(chat_id)
+                if chat_id in self._deferred:
+                    self._deferred.discard(chat_id)
+                    self._queue.put_nowait(chat_id)
+
+    async def run(self) -> None:
+        """Processes the queued updates, forever."""
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the queue depth, counters and recent wait times in seconds."""
+        waits = sorted(self._waits)
+
+        def percentile(value: float) -> float:
+            return waits[min(len(waits) - 1, int(value * len(waits)))] if waits else 0.0
+
+        return {
+            'depth': self.depth,
+            'max_size': self.max_size,
+            'active': len(self._active),
+            'processed': self.processed,
+            'superseded': self.superseded,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'wait_p50': percentile(0.5),
+            'wait_p99': percentile(0.99),
+            'wait_max': waits[-1] if waits else 0.0,
+        }
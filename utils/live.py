@@ -0,0 +1,136 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Text, Tuple
+
+from utils.cache import CacheBackend
+from utils.geo import haversine_km
+
+
+class LiveSession:
+    """Live location shared by a chat, and the flight cards sent for it."""
+
+    def __init__(self, chat_id: int, latitude: float, longitude: float,
+                 expires_at: float, max_flights: int = 10) -> None:
+        self.chat_id = chat_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.expires_at = expires_at
+        self.max_flights = max_flights
+        self.refreshed_at = 0.0
+        # Flight id -> (message id, rendered text) of the card sent for it.
+        self.messages: Dict[Text, Tuple[int, Text]] = {}
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {
+            'chat_id': self.chat_id,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'expires_at': self.expires_at,
+            'max_flights': self.max_flights,
+            'refreshed_at': self.refreshed_at,
+            'messages': self.messages,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[Text, Any]) -> "LiveSession":
+        session = cls(data['chat_id'], data['latitude'], data['longitude'],
+                      data['expires_at'], max_flights=data['max_flights'])
+        session.refreshed_at = data['refreshed_at']
+        session.messages = {
+            flight_id: tuple(message) for flight_id, message in data['messages'].items()}
+        return session
+
+
+class LiveSessionManager:
+    """Live location sessions of the chats.
+
+    A session lasts for the ``live_period`` of the shared location. A
+    location update only triggers a new lookup when the user moved at
+    least ``movement_threshold`` meters, or when the last lookup is older
+    than ``refresh_interval`` seconds. At most ``max_sessions`` sessions
+    are kept, the least recently updated ones being dropped first, and
+    each session follows at most ``max_flights`` flights.
+
+    With a ``backend``, the sessions are also saved to it, so that they
+    outlive a restart of the worker or move to another one.
+    """
+
+    def __init__(self, movement_threshold: float = 500, refresh_interval: float = 60,
+                 max_sessions: int = 10000, max_flights: int = 10,
+                 backend: Optional[CacheBackend] = None) -> None:
+        self.movement_threshold = movement_threshold
+        self.refresh_interval = refresh_interval
+        self.max_sessions = max_sessions
+        self.max_flights = max_flights
+        self.backend = backend
+        self._sessions: "OrderedDict[int, LiveSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _keep(self, session: LiveSession) -> None:
+        self._sessions.pop(session.chat_id, None)
+        while self._sessions and len(self._sessions) >= self.max_sessions:
+            self._sessions.popitem(last=False)
+        self._sessions[session.chat_id] = session
+
+    def start(self, chat_id: int, latitude: float, longitude: float,
+              expires_at: float) -> LiveSession:
+        """Starts a new session for the chat, replacing the current one."""
+        session = LiveSession(
+            chat_id, latitude, longitude, expires_at, max_flights=self.max_flights)
+        self._keep(session)
+        return session
+
+    def get(self, chat_id: int) -> Optional[LiveSession]:
+        """Returns the running session of the chat, if any."""
+        session = self._sessions.get(chat_id)
+        if session is not None and session.expired:
+            self._sessions.pop(chat_id, None)
+            return None
+        return session
+
+    async def load(self, chat_id: int) -> Optional[LiveSession]:
+        """Returns the running session of the chat, loading it from the
+        backend when this worker does not hold it."""
+        session = self.get(chat_id)
+        if session is not None or self.backend is None:
+            return session
+        data = await self.backend.get(f"live:{chat_id}")
+        if data is None:
+            return None
+        session = LiveSession.from_dict(data)
+        if session.expired:
+            return None
+        self._keep(session)
+        return session
+
+    async def save(self, session: LiveSession) -> None:
+        """Saves the session to the backend, until it expires."""
+        if self.backend is not None and not session.expired:
+            await self.backend.set(f"live:{session.chat_id}", session.to_dict(),
+                                   session.expires_at - time.time())
+
+    async def end(self, chat_id: int) -> None:
+        self._sessions.pop(chat_id, None)
+        if self.backend is not None:
+            await self.backend.delete(f"live:{chat_id}")
+
+    def move(self, session: LiveSession, latitude: float, longitude: float) -> bool:
+        """Updates the session location.
+
+        Returns whether the flights around the new location should be
+        looked up again.
+        """
+        self._sessions.move_to_end(session.chat_id)
+        moved = 1000 * haversine_km(
+            session.latitude, session.longitude, latitude, longitude)
+        if moved < self.movement_threshold and \
+                time.time() - session.refreshed_at < self.refresh_interval:
+            return False
+        session.latitude, session.longitude = latitude, longitude
+        return True
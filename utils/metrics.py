@@ -0,0 +1,139 @@
+import bisect
+import logging
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Text, Tuple
+
+Labels = Tuple[Tuple[Text, Text], ...]
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _labels(labels: Dict[Text, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> Text:
+    labels = labels + extra
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Counters, gauges and timing spans of the bot.
+
+    Spans time a block of code into the ``span_seconds`` histogram,
+    labelled with the span name. Gauges are read from the registered
+    collectors when the metrics are rendered, in the Prometheus text
+    format. Recording is a few dict operations, cheap enough for the hot
+    path.
+    """
+
+    def __init__(self, namespace: Text = "plane_goes_to_bot",
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.namespace = namespace
+        self.buckets = buckets
+        self.counters: Dict[Text, Dict[Labels, float]] = {}
+        self.histograms: Dict[Text, Dict[Labels, Histogram]] = {}
+        self.collectors: List[Callable[[], Dict[Text, float]]] = []
+
+    def increment(self, name: Text, value: float = 1, **labels: Any) -> None:
+        """Increments the ``name`` counter."""
+        counter = self.counters.setdefault(name, {})
+        key = _labels(labels)
+        counter[key] = counter.get(key, 0) + value
+
+    def observe(self, name: Text, value: float, **labels: Any) -> None:
+        """Records a value of the ``name`` histogram."""
+        histogram = self.histograms.setdefault(name, {})
+        key = _labels(labels)
+        if key not in histogram:
+            histogram[key] = Histogram(self.buckets)
+        histogram[key].observe(value)
+
+    @contextmanager
+    def span(self, name: Text, **labels: Any) -> Iterator[None]:
+        """Times the enclosed block, failed or not."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("span_seconds", time.perf_counter() - started,
+                         span=name, **labels)
+
+    def register_collector(self, collector: Callable[[], Dict[Text, float]]) -> None:
+        """Adds a callable returning gauge values by name."""
+        self.collectors.append(collector)
+
+    def render(self) -> Text:
+        """Returns the metrics in the Prometheus text format."""
+        lines = []
+        for name, counter in sorted(self.counters.items()):
+            name = f"{self.namespace}_{name}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f"{name}{_format_labels(labels)} {value}"
+                         for labels, value in counter.items())
+
+        for name, histograms in sorted(self.histograms.items()):
+            name = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in histograms.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    bound = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket"
+                                 f"{_format_labels(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for collector in self.collectors:
+            for name, value in sorted(collector().items()):
+                name = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class PayloadLogger:
+    """Samples the DEBUG logs of payloads.
+
+    Only ``sample_rate`` of the payloads are logged, and they are only
+    formatted when logged, so DEBUG can stay on under load.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_rate: float = 0.01) -> None:
+        self.logger = logger
+        self.sample_rate = sample_rate
+
+    def debug(self, message: Text, payload: Any,
+              sample_rate: Optional[float] = None) -> None:
+        """Logs ``message`` with the payload, %-formatted, if sampled."""
+        sample_rate = self.sample_rate if sample_rate is None else sample_rate
+        if self.logger.isEnabledFor(logging.DEBUG) and random.random() < sample_rate:
+            self.logger.debug(message, payload)
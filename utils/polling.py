@@ -0,0 +1,88 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Text
+
+from aiogram import Bot
+
+from env.settings import logger
+
+ALLOWED_UPDATES = ['message', 'edited_message']
+
+
+class UpdatePoller:
+    """Long-polling runtime of the bot.
+
+    Updates are pulled with ``getUpdates`` in batches of at most
+    ``batch_size``, waiting up to ``timeout`` seconds for new ones, and
+    passed to ``handler`` one by one. The offset of the next update is
+    checkpointed to ``offset_path`` after every batch, so a restarted bot
+    resumes where it stopped.
+    """
+
+    def __init__(self, bot: Bot, handler: Callable[[Dict[Text, Any]], Awaitable[Any]],
+                 batch_size: int = 100, timeout: int = 30,
+                 offset_path: Optional[Text] = None, retry_delay: float = 1.0,
+                 max_retry_delay: float = 30.0) -> None:
+        self.bot = bot
+        self.handler = handler
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.offset_path = offset_path
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.offset = self.load_offset()
+
+    def load_offset(self) -> Optional[int]:
+        """Returns the checkpointed offset, if any."""
+        if not self.offset_path or not os.path.exists(self.offset_path):
+            return None
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring the update offset checkpoint: {e}")
+            return None
+
+    def save_offset(self) -> None:
+        """Checkpoints the offset, atomically."""
+        if not self.offset_path or self.offset is None:
+            return
+        temporary_path = f"{self.offset_path}.tmp"
+        try:
+            with open(temporary_path, 'w') as f:
+                f.write(str(self.offset))
+            os.replace(temporary_path, self.offset_path)
+        except OSError as e:
+            logger.warning(f"Failed to checkpoint the update offset: {e}")
+
+    async def poll(self) -> List[Dict[Text, Any]]:
+        """Returns the next batch of updates, as their webhook payloads."""
+        updates = await self.bot.get_updates(
+            offset=self.offset, limit=self.batch_size,
+            timeout=self.timeout, allowed_updates=ALLOWED_UPDATES)
+        return [update.to_python() for update in updates]
+
+    async def run(self) -> None:
+        """Polls and handles the updates, forever."""
+        delay = self.retry_delay
+        while True:
+            try:
+                updates = await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Failed to get updates, retrying in {delay} seconds: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            delay = self.retry_delay
+
+            for update in updates:
+                try:
+                    await self.handler(update)
+                except Exception as e:
+                    logger.exception(f"Failed to process update "
+                                     f"{update.get('update_id')}: {e}")
+            if updates:
+                self.offset = updates[-1]['update_id'] + 1
+                self.save_offset()
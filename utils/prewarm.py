@@ -0,0 +1,118 @@
+import asyncio
+import heapq
+import time
+from typing import Dict, List, Tuple
+
+from env.settings import logger
+from utils.tiles import Bounds, FlightTileIndex, Tile
+
+
+class RegionPoller:
+    """Keeps the flights of the most requested regions warm.
+
+    Every user lookup bumps the score of the tiles it covers, and scores
+    decay with a ``half_life`` in seconds. A tile is hot once its score
+    reaches ``min_score``, so it takes repeated lookups, and it cools down
+    when they stop. Every ``interval`` seconds the ``max_tiles`` hottest
+    tiles are refetched, then the details of their uncached flights are
+    prefetched, with at most ``budget`` upstream requests per round. User
+    lookups are then served from the warm tiles and details cache. Tiles
+    whose score falls under ``forget_score`` are no longer tracked. The
+    bot workers sharing the tiles of their index refresh each tile once.
+    """
+
+    def __init__(self, tile_index: FlightTileIndex, interval: float = 8,
+                 max_tiles: int = 16, budget: int = 60, half_life: float = 300,
+                 min_score: float = 2.5, forget_score: float = 0.05,
+                 max_tracked: int = 4096, details_concurrency: int = 8,
+                 details_timeout: float = 5.0) -> None:
+        self.tile_index = tile_index
+        self.interval = interval
+        self.max_tiles = max_tiles
+        self.budget = budget
+        self.half_life = half_life
+        self.min_score = min_score
+        self.forget_score = forget_score
+        self.max_tracked = max_tracked
+        self.details_concurrency = details_concurrency
+        self.details_timeout = details_timeout
+        self._scores: Dict[Tile, Tuple[float, float]] = {}
+
+    def _score(self, tile: Tile, now: float) -> float:
+        score, updated_at = self._scores.get(tile, (0.0, now))
+        return score * 0.5 ** ((now - updated_at) / self.half_life)
+
+    def record(self, bounds: Bounds) -> None:
+        """Records a lookup of the given bounds."""
+        now = time.monotonic()
+        for tile in self.tile_index.tiles_for_bounds(bounds):
+            self._scores[tile] = (self._score(tile, now) + 1, now)
+        if len(self._scores) > self.max_tracked:
+            self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        scores = {tile: self._score(tile, now) for tile in self._scores}
+        keep = heapq.nlargest(self.max_tracked // 2, scores, key=scores.get)
+        self._scores = {tile: (scores[tile], now) for tile in keep}
+
+    def hot_tiles(self) -> List[Tile]:
+        """Returns the hottest tiles, hottest first."""
+        now = time.monotonic()
+        scores = {tile: self._score(tile, now) for tile in self._scores}
+        for tile in [tile for tile, score in scores.items() if score < self.forget_score]:
+            del self._scores[tile]
+        hot = [tile for tile, score in scores.items() if score >= self.min_score]
+        return heapq.nlargest(self.max_tiles, hot, key=scores.get)
+
+    async def refresh(self) -> None:
+        """Refreshes the hot tiles and prefetches their flight details."""
+        tiles = self.hot_tiles()[:self.budget]
+        # The bot workers sharing the tiles refresh each one once.
+        tiles = [tile for tile in tiles
+                 if await self.tile_index.claim_refresh(tile, self.interval)]
+        if not tiles:
+            return
+        # Tiles which would expire before the next round are refetched now,
+        # so lookups never wait for them.
+        max_age = max(0.0, self.tile_index.refresh_interval - self.interval)
+        results = await asyncio.gather(
+            *(self.tile_index.get_tile(tile, max_age=max_age) for tile in tiles),
+            return_exceptions=True)
+
+        fr_api, budget = self.tile_index.fr_api, self.budget - len(tiles)
+        cache = fr_api.cache
+        flights = []
+        for tile, result in zip(tiles, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to refresh tile {tile}: {result}")
+                continue
+            for flight in result:
+                if len(flights) >= budget:
+                    break
+                if cache is not None and not await cache.contains(flight.id):
+                    flights.append(flight.id)
+
+        semaphore = asyncio.Semaphore(self.details_concurrency)
+
+        async def prefetch(flight_id):
+            async with semaphore:
+                await asyncio.wait_for(
+                    asyncio.shield(fr_api.fetch_flight_details(flight_id)),
+                    timeout=self.details_timeout)
+
+        results = await asyncio.gather(
+            *(prefetch(flight_id) for flight_id in flights), return_exceptions=True)
+        failed = sum(isinstance(result, Exception) for result in results)
+        logger.debug(f"Prewarmed {len(tiles)} tiles and {len(flights) - failed} "
+                     f"flight details, {failed} failed.")
+
+    async def run(self) -> None:
+        """Refreshes the hot regions every ``interval`` seconds, forever."""
+        logger.info("Region poller started.")
+        while True:
+            started_at = time.monotonic()
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.exception(f"Failed to prewarm regions: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started_at)))
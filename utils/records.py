@@ -0,0 +1,196 @@
+import sys
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from utils.reference import airport_code, get_reference_index
+
+NOT_AVAILABLE = 'N/A'
+
+
+def intern(value: Any) -> Any:
+    """Interns strings, so that repeated names share one object."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def airport_field(code: Optional[Text], field: Text, default: Any = NOT_AVAILABLE) -> Any:
+    """Returns a field of the airport of a code, from the reference index."""
+    airport = get_reference_index().airport(code)
+    value = getattr(airport, field) if airport is not None else None
+    return default if value is None else value
+
+
+class HistoryLeg:
+    """A past leg of an aircraft, whose airport names are resolved
+    from their codes."""
+
+    __slots__ = ('origin_code', 'destination_code')
+
+    def __init__(self, origin_code: Text, destination_code: Text) -> None:
+        self.origin_code = intern(origin_code)
+        self.destination_code = intern(destination_code)
+
+    @property
+    def origin_airport(self) -> Text:
+        return airport_field(self.origin_code, 'name', self.origin_code)
+
+    @property
+    def destination_airport(self) -> Text:
+        return airport_field(self.destination_code, 'name', self.destination_code)
+
+    def get(self, key: Text, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def to_dict(self) -> Dict[Text, Text]:
+        return {
+            'origin_airport': self.origin_airport,
+            'destination_airport': self.destination_airport,
+        }
+
+
+def parse_aircraft_history(aircraft_history: Optional[List[Dict]]) -> Tuple[HistoryLeg, ...]:
+    """Parses the legs of a FlightRadar24 aircraft history, skipping the
+    ones with an unknown airport."""
+    legs = []
+    for item in aircraft_history or ():
+        airport = item.get("airport")
+        if not airport:
+            continue
+        origin, destination = airport_code(airport.get("origin")), \
+            airport_code(airport.get("destination"))
+        if origin and destination:
+            legs.append(HistoryLeg(origin, destination))
+    return tuple(legs)
+
+
+class FlightRecord:
+    """Flight information reported to the users.
+
+    Records are slotted and only carry the airline and airport codes,
+    whose names are resolved by the reference index, which keeps
+    thousands of them cheap to hold. They read like the flight
+    information dicts through ``get``, and ``to_dict`` returns that dict
+    form for serialization.
+    """
+
+    __slots__ = (
+        'id', 'number', 'callsign', 'airline_code',
+        'aircraft_name', 'aircraft_code', 'aircraft_history',
+        'origin_airport_code', 'destination_airport_code',
+        'altitude', 'heading', 'speed', 'vertical_speed',
+        'status', 'status_text', 'status_icon',
+        'time_details', 'distance', 'bearing',
+        'origin_airport_timezone', 'destination_airport_timezone', 'data_age',
+    )
+
+    # Fields of the dict form, the resolved names included.
+    FIELDS = (
+        'id', 'number', 'callsign',
+        'airline_name', 'airline_code',
+        'aircraft_name', 'aircraft_code', 'aircraft_history',
+        'origin_airport_country_name', 'origin_airport_country_code',
+        'origin_airport_name', 'origin_airport_code',
+        'destination_airport_country_name', 'destination_airport_country_code',
+        'destination_airport_name', 'destination_airport_code',
+        'altitude', 'heading', 'speed', 'vertical_speed',
+        'status', 'status_text', 'status_icon',
+        'time_details', 'distance', 'bearing',
+        'origin_airport_timezone', 'destination_airport_timezone', 'data_age',
+    )
+
+    # Fields left out of the dict form when unset.
+    OPTIONAL_FIELDS = ('origin_airport_timezone', 'destination_airport_timezone', 'data_age')
+
+    def __init__(self, **fields: Any) -> None:
+        for field in self.__slots__:
+            setattr(self, field, fields.get(field))
+
+    @classmethod
+    def from_flight(cls, flight: Any, distance: Optional[float] = None,
+                    bearing: Optional[float] = None) -> "FlightRecord":
+        """Creates the record of a FlightRadar24 flight.
+
+        Flights without details only carry their feed row attributes, and
+        the last known ones served instead of fresh ones their age.
+        """
+        details = getattr
+
+        def code(iata: Text, icao: Optional[Text]) -> Text:
+            # Airports without an IATA code, which the feed tells as N/A,
+            # are known by their ICAO one.
+            for value in (iata, icao):
+                if value not in (None, '', NOT_AVAILABLE):
+                    return value
+            return iata
+
+        return cls(
+            id=flight.id,
+            number=intern(flight.number),
+            callsign=flight.callsign,
+            airline_code=intern(flight.airline_icao),
+            aircraft_name=intern(details(flight, 'aircraft_model', NOT_AVAILABLE)),
+            aircraft_code=intern(flight.aircraft_code),
+            aircraft_history=parse_aircraft_history(
+                details(flight, 'aircraft_history', None)),
+            origin_airport_code=intern(code(
+                flight.origin_airport_iata, details(flight, 'origin_airport_icao', None))),
+            destination_airport_code=intern(code(
+                flight.destination_airport_iata,
+                details(flight, 'destination_airport_icao', None))),
+            altitude=flight.altitude,
+            heading=flight.heading,
+            speed=flight.ground_speed,
+            vertical_speed=flight.vertical_speed,
+            status="On Ground" if flight.on_ground else "On Air",
+            status_text=intern(details(flight, 'status_text', NOT_AVAILABLE)),
+            status_icon=intern(details(flight, 'status_icon', NOT_AVAILABLE)),
+            time_details=details(flight, 'time_details', {}),
+            distance=None if distance is None else round(float(distance), 1),
+            bearing=None if bearing is None else round(float(bearing)),
+            data_age=details(flight, 'data_age', None),
+        )
+
+    @property
+    def airline_name(self) -> Text:
+        airline = get_reference_index().airline(self.airline_code)
+        return airline.name if airline is not None and airline.name else NOT_AVAILABLE
+
+    @property
+    def origin_airport_name(self) -> Text:
+        return airport_field(self.origin_airport_code, 'name')
+
+    @property
+    def origin_airport_country_name(self) -> Text:
+        return airport_field(self.origin_airport_code, 'country_name')
+
+    @property
+    def origin_airport_country_code(self) -> Text:
+        return airport_field(self.origin_airport_code, 'country_code')
+
+    @property
+    def destination_airport_name(self) -> Text:
+        return airport_field(self.destination_airport_code, 'name')
+
+    @property
+    def destination_airport_country_name(self) -> Text:
+        return airport_field(self.destination_airport_code, 'country_name')
+
+    @property
+    def destination_airport_country_code(self) -> Text:
+        return airport_field(self.destination_airport_code, 'country_code')
+
+    def get(self, key: Text, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def to_dict(self) -> Dict[Text, Any]:
+        """Returns the flight information dict of the record."""
+        flight_information = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is None and field in self.OPTIONAL_FIELDS:
+                continue
+            if field == 'aircraft_history':
+                value = [leg.to_dict() for leg in value]
+            flight_information[field] = value
+        return flight_information
+
+    def __repr__(self) -> str:
+        return f"FlightRecord({self.to_dict()!r})"
@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Text, Tuple, Union
+
+logger = logging.getLogger('plane_goes_to_bot')
+
+# File layout: the header, the airports then the airlines key tables,
+# sorted by code, then the entries they point to.
+MAGIC = b'PGTREF01'
+HEADER = struct.Struct('<8sII')
+KEY = struct.Struct('<8sII')
+SEPARATOR = '\x1f'
+
+
+class Airport(NamedTuple):
+    code: Text
+    icao: Optional[Text]
+    name: Optional[Text]
+    city: Optional[Text]
+    country_name: Optional[Text]
+    country_code: Optional[Text]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    timezone: Optional[Text]
+
+
+class Airline(NamedTuple):
+    code: Text
+    iata: Optional[Text]
+    name: Optional[Text]
+    short_name: Optional[Text]
+
+
+Entry = Union[Airport, Airline]
+KINDS = {'airport': Airport, 'airline': Airline}
+FLOAT_FIELDS = ('latitude', 'longitude')
+
+
+def airport_code(airport: Optional[Dict[Text, Any]]) -> Optional[Text]:
+    """Returns the code of a FlightRadar24 airport, its IATA one if any."""
+    code = (airport or {}).get('code') or {}
+    return code.get('iata') or code.get('icao') or None
+
+
+def encode_entry(entry: Entry) -> bytes:
+    return SEPARATOR.join('' if value is None else str(value) for value in entry).encode()
+
+
+def decode_entry(kind: Text, data: bytes) -> Entry:
+    entry_type = KINDS[kind]
+    values = []
+    for field, value in zip(entry_type._fields, data.decode().split(SEPARATOR)):
+        if not value:
+            values.append(None)
+        elif field in FLOAT_FIELDS:
+            values.append(float(value))
+        else:
+            values.append(sys.intern(value))
+    return entry_type(*values)
+
+
+def compact_details(details: Dict[Any, Any]) -> Dict[Any, Any]:
+    """Returns a details payload whose airports and airline are reduced
+    to their codes, the rest being held by the reference index."""
+    def compact_airport(airport: Optional[Dict[Text, Any]]) -> Optional[Dict[Text, Any]]:
+        if not isinstance(airport, dict):
+            return airport
+        # The terminal, gate and baggage belt belong to the flight.
+        return {key: airport[key] for key in ('code', 'info') if key in airport}
+
+    compact = dict(details)
+    if isinstance(details.get('airline'), dict):
+        compact['airline'] = {'code': details['airline'].get('code')}
+    if isinstance(details.get('airport'), dict):
+        airports = details['airport']
+        compact['airport'] = {
+            **airports,
+            'origin': compact_airport(airports.get('origin')),
+            'destination': compact_airport(airports.get('destination')),
+        }
+    history = details.get('flightHistory')
+    if isinstance(history, dict) and isinstance(history.get('aircraft'), list):
+        legs = []
+        for leg in history['aircraft']:
+            airports = leg.get('airport') if isinstance(leg, dict) else None
+            if isinstance(airports, dict):
+                leg = {**leg, 'airport': {
+                    'origin': compact_airport(airports.get('origin')),
+                    'destination': compact_airport(airports.get('destination')),
+                }}
+            legs.append(leg)
+        compact['flightHistory'] = {**history, 'aircraft': legs}
+    return compact
+
+
+class ReferenceIndex:
+    """Airports and airlines seen in the flight details, by code.
+
+    The index is built from the observed details payloads, so flights
+    only need to carry codes. It is stored in a compact file of sorted
+    key tables, memory-mapped and binary-searched, so it costs little
+    memory however large it grows. New entries are kept in memory until
+    flushed; a flush merges them with the file as it is on disk, so that
+    processes sharing the file add up their entries. Lookups missing the
+    file reload it when changed, at most every ``reload_interval``
+    seconds.
+    """
+
+    def __init__(self, path: Optional[Text] = None, reload_interval: float = 60) -> None:
+        self.path = path
+        self.reload_interval = reload_interval
+        self._pending: Dict[Text, Dict[Text, Entry]] = {kind: {} for kind in KINDS}
+        self._resolved: Dict[Text, Dict[Text, Entry]] = {kind: {} for kind in KINDS}
+        self._mmap: Optional[mmap.mmap] = None
+        self._tables: Dict[Text, Tuple[int, int]] = {}
+        self._version: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        if path:
+            self.load()
+
+    def __len__(self) -> int:
+        on_disk = sum(count for _, count in self._tables.values())
+        return on_disk + sum(self._read(kind, code) is None
+                             for kind, entries in self._pending.items() for code in entries)
+
+    def load(self) -> None:
+        """Maps the index file, unless it did not change."""
+        self._checked_at = time.monotonic()
+        try:
+            stat = os.stat(self.path)
+        except (OSError, TypeError):
+            return
+        # Flushes replace the file, so a new file means a new version.
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._version:
+            return
+        with open(self.path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, airports, airlines = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            mapped.close()
+            raise ValueError(f"{self.path} is not a reference index.")
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap, self._version = mapped, version
+        self._tables = {
+            'airport': (HEADER.size, airports),
+            'airline': (HEADER.size + airports * KEY.size, airlines),
+        }
+        self._resolved = {kind: dict(entries) for kind, entries in self._pending.items()}
+
+    def _read(self, kind: Text, code: Text) -> Optional[Entry]:
+        if self._mmap is None:
+            return None
+        key = code.encode()
+        table, count = self._tables[kind]
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            entry_key, offset, length = KEY.unpack_from(self._mmap, table + middle * KEY.size)
+            entry_key = entry_key.rstrip(b'\0')
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle
+            else:
+                return decode_entry(kind, self._mmap[offset:offset + length])
+        return None
+
+    def get(self, kind: Text, code: Optional[Text]) -> Optional[Entry]:
+        """Returns the airport or airline of a code, if known."""
+        if not code:
+            return None
+        entry = self._resolved[kind].get(code)
+        if entry is None:
+            entry = self._read(kind, code)
+            if entry is None and self.path and \
+                    time.monotonic() - self._checked_at >= self.reload_interval:
+                self.load()
+                entry = self._read(kind, code)
+            if entry is not None:
+                self._resolved[kind][code] = entry
+        return entry
+
+    def airport(self, code: Optional[Text]) -> Optional[Airport]:
+        return self.get('airport', code)
+
+    def airline(self, code: Optional[Text]) -> Optional[Airline]:
+        return self.get('airline', code)
+
+    def add(self, entry: Entry) -> bool:
+        """Adds or updates an entry, keeping the known fields it lacks.
+
+        Returns whether the index changed.
+        """
+        kind = 'airport' if isinstance(entry, Airport) else 'airline'
+        if len(entry.code.encode()) > 8:
+            return False
+        known = self.get(kind, entry.code)
+        if known is not None:
+            entry = type(entry)(*(
+                value if value is not None else former
+                for value, former in zip(entry, known)))
+            if entry == known:
+                return False
+        self._pending[kind][entry.code] = entry
+        self._resolved[kind][entry.code] = entry
+        return True
+
+    def add_airport(self, airport: Optional[Dict[Text, Any]]) -> bool:
+        """Adds a FlightRadar24 airport object."""
+        code = airport_code(airport)
+        if code is None or not airport.get('name'):
+            return False
+        codes = airport.get('code') or {}
+        position = airport.get('position') or {}
+        country = position.get('country') or {}
+        return self.add(Airport(
+            code=code,
+            icao=codes.get('icao'),
+            name=airport.get('name'),
+            city=(position.get('region') or {}).get('city'),
+            country_name=country.get('name'),
+            country_code=country.get('code'),
+            latitude=position.get('latitude'),
+            longitude=position.get('longitude'),
+            timezone=(airport.get('timezone') or {}).get('name'),
+        ))
+
+    def observe(self, details: Dict[Any, Any]) -> int:
+        """Adds the airports and the airline of a details payload.
+
+        Returns the number of new or updated entries.
+        """
+        changed = 0
+        history = details.get('flightHistory') or {}
+        for leg in history.get('aircraft') or ():
+            airports = leg.get('airport') if isinstance(leg, dict) else None
+            if isinstance(airports, dict):
+                changed += self.add_airport(airports.get('origin'))
+                changed += self.add_airport(airports.get('destination'))
+        # Last, so that the most complete airport objects win.
+        airports = details.get('airport') or {}
+        changed += self.add_airport(airports.get('origin'))
+        changed += self.add_airport(airports.get('destination'))
+
+        airline = details.get('airline')
+        if isinstance(airline, dict) and airline.get('name'):
+            codes = airline.get('code') or {}
+            if codes.get('icao'):
+                changed += self.add(Airline(
+                    code=codes['icao'], iata=codes.get('iata'),
+                    name=airline['name'], short_name=airline.get('short')))
+        return changed
+
+    def _entries(self, kind: Text) -> Dict[bytes, bytes]:
+        """Returns the encoded entries of the mapped file."""
+        entries = {}
+        if self._mmap is not None:
+            table, count = self._tables[kind]
+            for index in range(count):
+                key, offset, length = KEY.unpack_from(self._mmap, table + index * KEY.size)
+                entries[key.rstrip(b'\0')] = self._mmap[offset:offset + length]
+        return entries
+
+    def serialize(self) -> bytes:
+        """Returns the index file content, the mapped and the new entries."""
+        sections: List[List[Tuple[bytes, bytes]]] = []
+        for kind in KINDS:
+            entries = self._entries(kind)
+            entries.update((code.encode(), encode_entry(entry))
+                           for code, entry in self._pending[kind].items())
+            sections.append(sorted(entries.items()))
+
+        offset = HEADER.size + KEY.size * sum(len(section) for section in sections)
+        header = [HEADER.pack(MAGIC, *(len(section) for section in sections))]
+        keys, data = [], []
+        for section in sections:
+            for key, entry in section:
+                keys.append(KEY.pack(key, offset, len(entry)))
+                data.append(entry)
+                offset += len(entry)
+        return b''.join(header + keys + data)
+
+    async def flush(self) -> int:
+        """Writes the new entries to the file, and returns their number."""
+        pending = sum(len(entries) for entries in self._pending.values())
+        if not self.path or not pending:
+            return 0
+        # Picks up the entries other processes flushed meanwhile.
+        self.load()
+        content = self.serialize()
+        flushed = {kind: dict(entries) for kind, entries in self._pending.items()}
+
+        def write() -> None:
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, 'wb') as f:
+                f.write(content)
+            os.replace(temporary, self.path)
+
+        await asyncio.get_running_loop().run_in_executor(None, write)
+        for kind, entries in flushed.items():
+            for code, entry in entries.items():
+                # Unless updated while written.
+                if self._pending[kind].get(code) is entry:
+                    del self._pending[kind][code]
+        self.load()
+        return pending
+
+    async def run(self, interval: float = 60) -> None:
+        """Flushes the new entries every ``interval`` seconds, forever."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(f"Failed to flush the reference index: {e}")
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+_reference_index: Optional[ReferenceIndex] = None
+
+
+def get_reference_index(path: Optional[Text] = None) -> ReferenceIndex:
+    """Returns the process-wide reference index, creating it on first use."""
+    global _reference_index
+    if _reference_index is None:
+        _reference_index = ReferenceIndex(path)
+    return _reference_index
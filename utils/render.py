@@ -0,0 +1,209 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional, Text, Tuple
+
+from utils.timezones import resolve_timezone
+
+TIME_KINDS = ('scheduled', 'real', 'estimated')
+TIME_EVENTS = ('departure', 'arrival')
+# Most accurate first, for the local times.
+LOCAL_TIME_KINDS = ('real', 'estimated', 'scheduled')
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Compiled once at import; rendering is a single format_map call.
+FLIGHT_TEMPLATE = (
+    "<b>Flight Information</b>\n"
+    "{data_age}"
+    "<b>Flight ID:</b> {id}\n"
+    "<b>Flight Number:</b> {number}\n"
+    "<b>Flight CallSign:</b> {callsign}\n"
+    "--------------------\n"
+    "<b>Airline Name:</b> {airline_name} ({airline_code})\n"
+    "--------------------\n"
+    "<b>Aircraft Name:</b> {aircraft_name} ({aircraft_code})\n"
+    "--------------------\n"
+    "<b>Origin Airport Country Name:</b> {origin_airport_country_name} "
+    "({origin_airport_country_code})\n"
+    "<b>Origin Airport Name:</b> {origin_airport_name} ({origin_airport_code})\n"
+    "--------------------\n"
+    "<b>Destination Airport Country Name:</b> {destination_airport_country_name} "
+    "({destination_airport_country_code})\n"
+    "<b>Destination Airport Name:</b> {destination_airport_name} "
+    "({destination_airport_code})\n"
+    "--------------------\n"
+    "<b>Altitude:</b> {altitude}\n"
+    "<b>Heading:</b> {heading}\n"
+    "<b>Speed:</b> {speed}\n"
+    "<b>Vertical Speed:</b> {vertical_speed}\n"
+    "<b>Status:</b> {status}\n"
+    "<b>Status Text:</b> {status_text}\n"
+    "--------------------\n"
+    "<b>Time Details:</b>\n"
+    "    Scheduled: \n"
+    "        Departure: <code>{scheduled_departure}</code>\n"
+    "        Arrival: <code>{scheduled_arrival}</code>\n"
+    "    Real:\n"
+    "        Departure: <code>{real_departure}</code>\n"
+    "        Arrival: <code>{real_arrival}</code>\n"
+    "    Estimated:\n"
+    "        Departure: <code>{estimated_departure}</code>\n"
+    "        Arrival: <code>{estimated_arrival}</code>\n"
+    "{local_times}"
+    "--------------------\n"
+    "<b>Aircraft History:</b> \n{aircraft_history}\n"
+    "--------------------\n"
+    "Powered by <code>FlightRadar24</code>\n"
+).format_map
+
+COMPACT_FLIGHT_TEMPLATE = (
+    "<b>{number}</b> ({callsign}) {airline_name}\n"
+    "{aircraft_name} ({aircraft_code})\n"
+    "<code>{origin_airport_code} -> {destination_airport_code}</code> {status_text}\n"
+    "{altitude} ft, {speed} kt, {heading}°\n"
+    "{data_age}"
+).format_map
+
+SUMMARY_FLIGHT_TEMPLATE = (
+    "<b>{callsign}</b> {altitude} ft, {distance} km away\n"
+    "<i>Getting its details...</i>\n"
+    "{data_age}"
+).format_map
+
+DATA_AGE_LINE = "<i>Last known data, from {} ago.</i>\n".format
+
+LOCAL_TIMES_TEMPLATE = (
+    "    Local:\n"
+    "        Departure: <code>{departure}</code> ({departure_timezone})\n"
+    "        Arrival: <code>{arrival}</code> ({arrival_timezone})\n"
+).format_map
+
+HISTORY_LINE = "\t\t\t - <code>{} -> {}</code>".format
+
+FLIGHT_FIELDS = (
+    'id', 'number', 'callsign', 'airline_name', 'airline_code',
+    'aircraft_name', 'aircraft_code',
+    'origin_airport_country_name', 'origin_airport_country_code',
+    'origin_airport_name', 'origin_airport_code',
+    'destination_airport_country_name', 'destination_airport_country_code',
+    'destination_airport_name', 'destination_airport_code',
+    'altitude', 'heading', 'speed', 'vertical_speed', 'status', 'status_text',
+)
+
+
+def data_age_line(data_age: Optional[float]) -> Text:
+    """Returns the line telling the age of last known flight data."""
+    if not data_age:
+        return ""
+    if data_age < 60:
+        return DATA_AGE_LINE(f"{data_age:.0f} s")
+    return DATA_AGE_LINE(f"{data_age // 60:.0f} min")
+
+
+class FlightRenderer:
+    """Renders flight information messages.
+
+    Timestamps are shown in ``timezone`` when given, otherwise in the
+    local time of the server. Formatted timestamps are cached, since the
+    same scheduled times come back on every update of a flight.
+
+    Flights carrying the ``origin_airport_timezone`` and
+    ``destination_airport_timezone`` names also get their departure and
+    arrival in the local time of the airports.
+
+    Flights still waiting for their details can be rendered as a summary
+    of their feed data, to be replaced by their card once they have them.
+
+    Flights carrying a ``data_age`` are last known flights, served while
+    FlightRadar24 is unavailable, and their age is shown.
+
+    Flights are either flight information dicts or ``FlightRecord``s.
+    """
+
+    def __init__(self, timezone: Optional[Text] = None) -> None:
+        self.timezone = resolve_timezone(timezone) if timezone else None
+        self.format_timestamp = lru_cache(maxsize=4096)(self._format_timestamp)
+        self.format_local_timestamp = lru_cache(maxsize=4096)(
+            self._format_local_timestamp)
+
+    def _format_timestamp(self, timestamp: int) -> Text:
+        return datetime.fromtimestamp(timestamp, self.timezone).strftime(TIME_FORMAT)
+
+    def _format_local_timestamp(self, timestamp: int, timezone: Text) -> Text:
+        return datetime.fromtimestamp(
+            timestamp, resolve_timezone(timezone)).strftime(TIME_FORMAT)
+
+    def _values(self, flight_detail: Dict[Text, Any]) -> Dict[Text, Any]:
+        get = flight_detail.get
+        values = {field: get(field) for field in FLIGHT_FIELDS}
+
+        time_details = get('time_details', {})
+        time_details = time_details if isinstance(time_details, dict) else {}
+        format_timestamp = self.format_timestamp
+        timestamps = {}
+        for kind in TIME_KINDS:
+            times = time_details.get(kind, {})
+            times = times if isinstance(times, dict) else {}
+            for event in TIME_EVENTS:
+                value = times.get(event, "")
+                if value and isinstance(value, int):
+                    timestamps[kind, event] = int(value)
+                    value = format_timestamp(int(value))
+                values[f"{kind}_{event}"] = value
+
+        values['local_times'] = self._local_times(flight_detail, timestamps)
+        values['data_age'] = data_age_line(get('data_age'))
+        return values
+
+    def _local_times(self, flight_detail: Dict[Text, Any],
+                     timestamps: Dict[Tuple[Text, Text], int]) -> Text:
+        departure_timezone = flight_detail.get('origin_airport_timezone')
+        arrival_timezone = flight_detail.get('destination_airport_timezone')
+        if not departure_timezone and not arrival_timezone:
+            return ""
+
+        def local_time(event: Text, timezone: Optional[Text]) -> Text:
+            if not timezone:
+                return ""
+            for kind in LOCAL_TIME_KINDS:
+                if (kind, event) in timestamps:
+                    return self.format_local_timestamp(timestamps[kind, event], timezone)
+            return ""
+
+        return LOCAL_TIMES_TEMPLATE({
+            'departure': local_time('departure', departure_timezone),
+            'departure_timezone': departure_timezone or "N/A",
+            'arrival': local_time('arrival', arrival_timezone),
+            'arrival_timezone': arrival_timezone or "N/A",
+        })
+
+    def render(self, flight_detail: Dict[Text, Any]) -> Text:
+        """Renders the full flight information message."""
+        values = self._values(flight_detail)
+        values['aircraft_history'] = "\n".join([
+            HISTORY_LINE(item.get('origin_airport'), item.get('destination_airport'))
+            for item in flight_detail.get('aircraft_history', [])
+        ])
+        return FLIGHT_TEMPLATE(values)
+
+    def render_compact(self, flight_detail: Dict[Text, Any]) -> Text:
+        """Renders a short flight information message, fit for group chats."""
+        get = flight_detail.get
+        values = {field: get(field) for field in FLIGHT_FIELDS}
+        values['data_age'] = data_age_line(get('data_age'))
+        return COMPACT_FLIGHT_TEMPLATE(values)
+
+    def render_summary(self, flight_detail: Dict[Text, Any]) -> Text:
+        """Renders the summary of a flight waiting for its details."""
+        get = flight_detail.get
+        return SUMMARY_FLIGHT_TEMPLATE({
+            'callsign': get('callsign'),
+            'altitude': get('altitude'),
+            'distance': get('distance'),
+            'data_age': data_age_line(get('data_age')),
+        })
+
+
+@lru_cache(maxsize=None)
+def get_renderer(timezone: Optional[Text] = None) -> FlightRenderer:
+    """Returns the shared renderer of the given timezone."""
+    return FlightRenderer(timezone)
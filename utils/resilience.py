@@ -0,0 +1,102 @@
+import time
+from typing import Any, Dict, Text
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Stops calling an upstream which keeps failing.
+
+    After ``failure_threshold`` failures in a row the circuit opens, and
+    calls fail fast with ``CircuitOpenError`` for ``reset_timeout``
+    seconds. A single trial call is then let through: its success closes
+    the circuit, its failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name: Text, failure_threshold: int = 5,
+                 reset_timeout: float = 30) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+
+    @property
+    def state(self) -> Text:
+        if self.failures < self.failure_threshold:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def before_call(self) -> None:
+        """Raises ``CircuitOpenError`` unless a call may go through."""
+        state = self.state
+        if state == self.CLOSED:
+            return
+        if state == self.HALF_OPEN and not self._trial:
+            self._trial = True
+            return
+        raise CircuitOpenError(f"The {self.name} circuit is open.")
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Ends a call which neither succeeded nor failed, as a cancelled one."""
+        self._trial = False
+
+
+class AdaptiveTimeout:
+    """Request timeout following the observed latencies.
+
+    As the TCP retransmission timeout, it is the smoothed latency plus
+    four times its mean deviation, kept within ``minimum`` and
+    ``maximum``. Each timeout doubles it until a request succeeds, so a
+    slowing upstream is not cut off at its former latency.
+    """
+
+    def __init__(self, initial: float = 5.0, minimum: float = 1.0,
+                 maximum: float = 10.0) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency = None
+        self.deviation = 0.0
+        self.backoff = 1
+        self._initial = initial
+
+    @property
+    def value(self) -> float:
+        if self.latency is None:
+            timeout = self._initial
+        else:
+            timeout = self.latency + 4 * self.deviation
+        return min(max(timeout * self.backoff, self.minimum), self.maximum)
+
+    def observe(self, seconds: float) -> None:
+        """Records the latency of a successful request."""
+        if self.latency is None:
+            self.latency, self.deviation = seconds, seconds / 2
+        else:
+            self.deviation += (abs(self.latency - seconds) - self.deviation) / 4
+            self.latency += (seconds - self.latency) / 8
+        self.backoff = 1
+
+    def timed_out(self) -> None:
+        if self.value < self.maximum:
+            self.backoff *= 2
+
+    def stats(self) -> Dict[Text, Any]:
+        return {'timeout': self.value, 'latency': self.latency}
@@ -0,0 +1,77 @@
+import zlib
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+import aiohttp
+
+from env.settings import logger
+
+WEBHOOK_PATH = '/webhooks/telegram/webhook'
+
+
+def update_chat_id(update: Dict[Text, Any]) -> Optional[int]:
+    """Returns the chat id of a Telegram update, if any."""
+    message = update.get('message') or update.get('edited_message') or {}
+    return message.get('chat', {}).get('id')
+
+
+def worker_index(chat_id: Any, workers: int) -> int:
+    """Returns the worker of a chat, the same one in every process."""
+    if isinstance(chat_id, int):
+        return chat_id % workers
+    # Unlike hash(), stable across processes.
+    return zlib.crc32(str(chat_id).encode()) % workers
+
+
+class WorkerUnavailableError(Exception):
+    """Raised when no worker could process an update."""
+
+
+class UpdateRouter:
+    """Forwards the Telegram updates to the bot workers.
+
+    The updates of a chat always go to the same worker, picked from the
+    chat id, so that its live session stays on one worker. When that
+    worker is unreachable or fails, the update goes to the next one.
+    Workers are bot instances reachable at ``worker_urls``, on this host
+    or not.
+    """
+
+    def __init__(self, worker_urls: List[Text], timeout: float = 10.0) -> None:
+        if not worker_urls:
+            raise ValueError("The update router needs at least one worker.")
+        self.worker_urls = [url.rstrip('/') for url in worker_urls]
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def worker_url(self, update: Dict[Text, Any]) -> Text:
+        """Returns the url of the worker of an update."""
+        return self.worker_urls[self._worker_index(update)]
+
+    def _worker_index(self, update: Dict[Text, Any]) -> int:
+        return worker_index(update_chat_id(update), len(self.worker_urls))
+
+    async def forward(self, update: Dict[Text, Any]) -> Tuple[bool, Text]:
+        """Forwards an update to its worker, and returns the worker answer.
+
+        Raises ``WorkerUnavailableError`` when every worker failed.
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        first = self._worker_index(update)
+        for attempt in range(len(self.worker_urls)):
+            url = self.worker_urls[(first + attempt) % len(self.worker_urls)]
+            try:
+                async with self._session.post(url + WEBHOOK_PATH, json=update) as response:
+                    response.raise_for_status()
+                    answer = await response.json()
+                    return bool(answer.get('ok')), answer.get('description', "")
+            except Exception as e:
+                logger.warning(f"Failed to forward update {update.get('update_id')} "
+                               f"to {url}: {e}")
+        raise WorkerUnavailableError(
+            f"No worker processed update {update.get('update_id')}.")
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,197 @@
+import asyncio
+import copy
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Text, Tuple
+
+from FlightRadar24.entities.flight import Flight
+
+from env.settings import logger
+from utils.cache import CacheBackend
+from utils.flight_radar import AsyncFlightRadar24API
+from utils.metrics import metrics
+
+Tile = Tuple[int, int]
+Bounds = Tuple[float, float, float, float]
+
+
+class FlightTileIndex:
+    """Flight lists of fixed size world tiles.
+
+    The world is split into ``tile_size`` degree tiles. Each tile's flight
+    list is fetched at most once per ``refresh_interval`` seconds, and
+    concurrent requests for the same tile share one in-flight fetch. A
+    bounding box query is answered by filtering the tiles covering it, so
+    the upstream traffic grows with the active area, not the active users.
+
+    Tiles up to ``stale_while_revalidate`` seconds past their refresh are
+    served as they are while they are refetched in the background. Older
+    ones are refetched first, but if that fails their last known flights
+    are served, up to ``stale_if_error`` seconds old, with their age in
+    ``data_age``.
+
+    With a ``backend``, the fetched tiles are also saved to it, and a tile
+    is read from it before being fetched, so that the bot workers sharing
+    it fetch each tile once.
+    """
+
+    def __init__(self, fr_api: AsyncFlightRadar24API, tile_size: float = 1.0,
+                 refresh_interval: float = 10, max_tiles: int = 1024,
+                 stale_while_revalidate: float = 10, stale_if_error: float = 900,
+                 backend: Optional[CacheBackend] = None) -> None:
+        self.fr_api = fr_api
+        self.backend = backend
+        self.tile_size = tile_size
+        self.refresh_interval = refresh_interval
+        self.max_tiles = max_tiles
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.upstream_calls = 0
+        self._tiles: "OrderedDict[Tile, Tuple[float, List[Flight]]]" = OrderedDict()
+        self._inflight: Dict[Tile, asyncio.Task] = {}
+
+    def tiles_for_bounds(self, bounds: Bounds) -> List[Tile]:
+        """Returns the tiles covering the (north, south, west, east) bounds."""
+        north, south, west, east = bounds
+        rows = range(math.floor(south / self.tile_size),
+                     math.floor(min(north, 89.999) / self.tile_size) + 1)
+        # Bounds crossing the antimeridian have their west edge east of
+        # their east edge.
+        lon_ranges = [(west, east)] if west <= east else [(west, 180), (-180, east)]
+        columns = []
+        for lon_from, lon_to in lon_ranges:
+            columns.extend(range(math.floor(lon_from / self.tile_size),
+                                 math.floor(min(lon_to, 179.999) / self.tile_size) + 1))
+        return [(row, column) for row in rows for column in columns]
+
+    def tile_bounds(self, tile: Tile) -> Text:
+        """Returns the FlightRadar24 bounds string of a tile."""
+        row, column = tile
+        south, west = row * self.tile_size, column * self.tile_size
+        return f"{south + self.tile_size},{south},{west},{west + self.tile_size}"
+
+    async def get_tile(self, tile: Tile, max_age: Optional[float] = None) -> List[Flight]:
+        """Returns the flights of a tile.
+
+        The tile is fetched when older than ``max_age`` seconds, which is
+        ``refresh_interval`` by default.
+        """
+        return (await self._get_tile(tile, max_age))[1]
+
+    async def _get_tile(self, tile: Tile, max_age: Optional[float] = None
+                        ) -> Tuple[float, List[Flight]]:
+        """Returns the fetch time and the flights of a tile."""
+        max_age = self.refresh_interval if max_age is None else max_age
+        cached = self._tiles.get(tile)
+        age = time.monotonic() - cached[0] if cached is not None else None
+        if cached is not None and age < max_age:
+            self._tiles.move_to_end(tile)
+            metrics.increment("tile_cache_lookups", result="hit")
+            return cached
+
+        task = self._inflight.get(tile)
+        coalesced = task is not None
+        if task is None:
+            task = asyncio.create_task(self._fetch_tile(tile, max_age))
+            self._inflight[tile] = task
+            task.add_done_callback(lambda done: self._tile_task_done(tile, done))
+        if cached is not None and age < max_age + self.stale_while_revalidate:
+            metrics.increment("tile_cache_lookups", result="stale")
+            return cached
+
+        metrics.increment("tile_cache_lookups", result="coalesced" if coalesced else "miss")
+        try:
+            # Shielded so that a cancelled caller does not cancel the fetch
+            # other callers are waiting on.
+            return await asyncio.shield(task)
+        except Exception as e:
+            if cached is None or age >= self.stale_if_error:
+                raise
+            metrics.increment("tile_cache_lookups", result="stale_if_error")
+            logger.warning(f"Serving tile {tile} of {age:.0f} s ago: {e}")
+            return cached
+
+    def _tile_task_done(self, tile: Tile, task: asyncio.Task) -> None:
+        self._inflight.pop(tile, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch_tile(self, tile: Tile, max_age: float) -> Tuple[float, List[Flight]]:
+        entry = await self._load_tile(tile, max_age)
+        if entry is None:
+            self.upstream_calls += 1
+            metrics.increment("tile_upstream_calls")
+            flights = await self.fr_api.get_flights(bounds=self.tile_bounds(tile))
+            entry = (time.monotonic(), flights)
+            logger.debug(f"Fetched tile {tile}: {len(flights)} flights.")
+            await self._save_tile(tile, flights)
+        self._tiles[tile] = entry
+        self._tiles.move_to_end(tile)
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return entry
+
+    async def claim_refresh(self, tile: Tile, period: float) -> bool:
+        """Tells whether this process is the one of those sharing the
+        backend to refresh a tile for the next ``period`` seconds."""
+        if self.backend is None:
+            return True
+        return await self.backend.add(f"tile_refresh:{tile[0]}:{tile[1]}", 1, period)
+
+    async def _load_tile(self, tile: Tile, max_age: float
+                         ) -> Optional[Tuple[float, List[Flight]]]:
+        """Returns the tile saved to the backend, if younger than ``max_age``."""
+        if self.backend is None:
+            return None
+        saved = await self.backend.get(f"tile:{tile[0]}:{tile[1]}")
+        if saved is None:
+            return None
+        age = time.time() - saved['fetched_at']
+        if age >= max_age:
+            return None
+        flights = []
+        for fields in saved['flights']:
+            flight = Flight.__new__(Flight)
+            flight.__dict__.update(fields)
+            flights.append(flight)
+        metrics.increment("tile_cache_lookups", result="shared")
+        return time.monotonic() - age, flights
+
+    async def _save_tile(self, tile: Tile, flights: List[Flight]) -> None:
+        if self.backend is None:
+            return
+        await self.backend.set(
+            f"tile:{tile[0]}:{tile[1]}",
+            {'fetched_at': time.time(), 'flights': [vars(flight) for flight in flights]},
+            self.refresh_interval)
+
+    async def get_flights(self, bounds: Bounds) -> List[Flight]:
+        """Returns the flights inside the (north, south, west, east) bounds.
+
+        The flights are copies, so they can be enriched with details
+        without altering the cached tiles. Flights served past the
+        revalidation window of their tile have its age in seconds as
+        ``data_age``.
+        """
+        north, south, west, east = bounds
+        tiles = await asyncio.gather(
+            *(self._get_tile(tile) for tile in self.tiles_for_bounds(bounds)))
+
+        flights, seen = [], set()
+        now = time.monotonic()
+        for fetched_at, tile_flights in tiles:
+            age = now - fetched_at
+            stale = age >= self.refresh_interval + self.stale_while_revalidate
+            for flight in tile_flights:
+                if flight.id in seen or not south <= flight.latitude <= north:
+                    continue
+                if not (west <= flight.longitude <= east if west <= east
+                        else flight.longitude >= west or flight.longitude <= east):
+                    continue
+                seen.add(flight.id)
+                flight = copy.copy(flight)
+                if stale:
+                    flight.data_age = age
+                flights.append(flight)
+        return flights
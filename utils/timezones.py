@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from datetime import datetime, tzinfo
+from functools import lru_cache
+from typing import Iterable, List, Optional, Text, Tuple
+
+Point = Tuple[float, float]
+
+
+@lru_cache(maxsize=None)
+def resolve_timezone(name: Text) -> tzinfo:
+    """Returns the timezone of the given name, resolved once per name."""
+    import pytz
+
+    return pytz.timezone(name)
+
+
+class TimezoneService:
+    """Timezone lookups of coordinates.
+
+    The polygon data is loaded once, either kept in memory or read from
+    its memory-mapped files. Results are cached on a grid of
+    ``precision`` decimal degrees (about 1 km at the default 2), with at
+    most ``max_entries`` cells kept.
+    """
+
+    def __init__(self, in_memory: bool = False, precision: int = 2,
+                 max_entries: int = 65536) -> None:
+        import timezonefinder
+
+        self.finder = timezonefinder.TimezoneFinder(in_memory=in_memory)
+        self.precision = precision
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Point, Optional[Text]]" = OrderedDict()
+
+    def timezone_at(self, latitude: float, longitude: float) -> Optional[Text]:
+        """Returns the timezone name of a location, None on the high seas."""
+        key = (round(latitude, self.precision), round(longitude, self.precision))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        timezone = self.finder.certain_timezone_at(lat=key[0], lng=key[1])
+        self._cache[key] = timezone
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return timezone
+
+    def timezones_at(self, points: Iterable[Point]) -> List[Optional[Text]]:
+        """Returns the timezone names of many locations at once.
+
+        Locations sharing a grid cell, like the flights of an airport, are
+        only looked up once.
+        """
+        resolved = {}
+        timezones = []
+        for latitude, longitude in points:
+            key = (round(latitude, self.precision), round(longitude, self.precision))
+            if key not in resolved:
+                resolved[key] = self.timezone_at(*key)
+            timezones.append(resolved[key])
+        return timezones
+
+    def local_time(self, latitude: float, longitude: float,
+                   time_format: Text = '%Y-%m-%d %H:%M:%S') -> Optional[Text]:
+        """Returns the current local time of a location."""
+        timezone = self.timezone_at(latitude, longitude)
+        if timezone is None:
+            return None
+        return datetime.now(resolve_timezone(timezone)).strftime(time_format)
+
+
+_timezone_service: Optional[TimezoneService] = None
+
+
+def get_timezone_service(in_memory: bool = False) -> TimezoneService:
+    """Returns the process-wide timezone service, creating it on first use."""
+    global _timezone_service
+    if _timezone_service is None:
+        _timezone_service = TimezoneService(in_memory=in_memory)
+    return _timezone_service